@@ -0,0 +1,95 @@
+"""
+agg_cache.py
+
+Cache das linhas agregadas por arquivo do CK, endereçado pelo conteúdo.
+
+Cada linha é guardada sob o SHA-1 do class.csv (+ method.csv). Um segundo
+mapa (caminho, tamanho, mtime) -> hash permite consultar o cache sem ler os
+arquivos (lookup). Arquivos novos ou tocados têm o hash calculado por quem os
+agrega (ex.: os workers do csvator, ver known_digests); se o conteúdo já
+estiver no cache (arquivo tocado ou copiado para outro caminho), a linha vem
+de get e a agregação é pulada. As entradas menos usadas são descartadas
+quando o cache passa de `max_entries` (LRU).
+"""
+
+import hashlib
+import json
+import os
+from collections import OrderedDict
+
+MISSING = object()
+
+
+def file_digest(*paths, chunk_size=1024 * 1024):
+    h = hashlib.sha1()
+    for path in paths:
+        if path is None:
+            h.update(b"\0")
+            continue
+        with open(path, "rb") as fh:
+            for chunk in iter(lambda: fh.read(chunk_size), b""):
+                h.update(chunk)
+        h.update(b"\0")
+    return h.hexdigest()
+
+
+class AggregateCache:
+    def __init__(self, path, max_entries=20000):
+        self.path = path
+        self.max_entries = max_entries
+        self.rows = OrderedDict()  # hash -> linha agregada (None = CSV vazio/ilegível)
+        self.keys = {}             # "caminho|tamanho|mtime" -> hash
+        self.hits = 0
+        self._load()
+
+    def _load(self):
+        try:
+            with open(self.path, encoding="utf-8") as fh:
+                data = json.load(fh)
+        except (OSError, ValueError):
+            return
+        self.rows = OrderedDict(data.get("rows", []))
+        self.keys = data.get("keys", {})
+
+    @staticmethod
+    def stat_key(output):
+        return f"{output.class_csv}|{json.dumps(output.signature)}"
+
+    def lookup(self, output):
+        """Linha em cache pelo (caminho, tamanho, mtime), sem ler o arquivo; ou MISSING."""
+        digest = self.keys.get(self.stat_key(output))
+        if digest is None:
+            return MISSING
+        return self.get(digest, output)
+
+    def known_digests(self):
+        return frozenset(self.rows)
+
+    def get(self, digest, output):
+        """Linha guardada sob `digest`, com o nome do repo de `output`; ou MISSING."""
+        if digest not in self.rows:
+            return MISSING
+        self.rows.move_to_end(digest)
+        self.hits += 1
+        row = self.rows[digest]
+        # conteúdo idêntico pode vir de outro repo (ex.: fork): mantém o nome atual
+        return dict(row, repo=output.repo) if row is not None else None
+
+    def store(self, output, digest, row):
+        self.keys[self.stat_key(output)] = digest
+        self.rows[digest] = row
+        self.rows.move_to_end(digest)
+        while len(self.rows) > self.max_entries:
+            self.rows.popitem(last=False)
+
+    def remember(self, output, digest):
+        """Associa o stat de `output` a um hash já em cache (arquivo tocado, mesmo conteúdo)."""
+        self.keys[self.stat_key(output)] = digest
+
+    def save(self):
+        live = set(self.rows)
+        keys = {k: d for k, d in self.keys.items() if d in live}
+        tmp = self.path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as fh:
+            json.dump({"rows": list(self.rows.items()), "keys": keys}, fh)
+        os.replace(tmp, self.path)
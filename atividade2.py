@@ -18,16 +18,31 @@ Requisitos:
 
 import os
 import sys
+import math
 import time
+import threading
 import subprocess
+import queue
 import shutil
 import zipfile
-from datetime import datetime, timezone
+import tempfile
+import fnmatch
 from pathlib import Path
-from io import BytesIO
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
 import requests
+import numpy as np
 import pandas as pd
+from requests.adapters import HTTPAdapter
+
+from ratelimit import RateScheduler
+from run_journal import RunJournal
+from incremental_csv import IncrementalCSVWriter
+from ck_io import read_ck_csv
+from streamstats import ColumnStats, summarize_csv
+from tabular_io import with_format, write_table
+from repo_schema import flatten_repo, repos_to_frame
+from derived_metrics import age_years, collection_timestamp
 
 # -----------------------
 # CONFIGURAÇÕES
@@ -40,10 +55,47 @@ CK_REPO_DIR = Path("ck_tool")
 CK_OUTPUT_BASE = Path("lab02_ck_results")
 CK_LOCAL_JAR = CK_REPO_DIR / "target"
 CK_JAR_GLOB = "ck-*-jar-with-dependencies.jar"
+SOURCE_OID_FILE = ".source_oid"     # commit dos fontes extraídos em CLONES_DIR/<owner_repo>
 PER_PAGE = 50
 TOTAL_REPOS = 1000
-SLEEP_BETWEEN_PAGES = 1.0
+SHARDED_FETCH = False  # True: busca por faixas de estrelas em paralelo (permite > 1000 repos)
+STAR_RANGE_MIN = 100
+STAR_RANGE_MAX = 200000
+STAR_SHARDS = 16
+FETCH_WORKERS = 4
+SEARCH_RESULT_CAP = 1000  # limite de resultados por busca da API do GitHub
 CONSOLIDATED_CSV = "lab02_ck_all.csv"
+HTTP_POOL_SIZE = 8         # conexões keep-alive por host (>= FETCH_WORKERS e DOWNLOAD_WORKERS)
+DOWNLOAD_CHUNK_SIZE = 1024 * 1024   # bytes lidos por vez no download dos ZIPs
+SPOOL_MAX_BYTES = 32 * 1024 * 1024  # acima disso o ZIP vai para um arquivo temporário em disco
+SPOOL_DIR = None                    # None = diretório temporário padrão do sistema
+EXTRACT_ONLY_SOURCES = True         # False: extrai o ZIP inteiro (assets, jars, docs...)
+EXTRACT_INCLUDE = ["*.java"]        # globs dos arquivos extraídos (o CK só lê .java)
+EXTRACT_EXCLUDE = []                # ex.: ["*/src/test/*", "*/generated/*"]
+EPHEMERAL_SOURCES = False           # True: fontes em scratch efêmero, apagados após o CK
+SCRATCH_DIR = Path("/dev/shm") if Path("/dev/shm").is_dir() else None  # None = tmp do sistema
+SCRATCH_MAX_BYTES = 4 * 1024 ** 3   # teto de fontes extraídas no scratch somando todos os workers
+CK_PERSISTENT_JVM = True            # False: um "java -jar" por repositório
+CK_SERVER_SOURCE = Path(__file__).resolve().parent / "java" / "CKServer.java"  # requer Java 11+
+CK_JVM_OPTS = ["-Xmx2g"]            # heap de cada JVM do CK
+DOWNLOAD_WORKERS = 4                # threads da etapa de download (I/O)
+# threads da etapa CK; cada uma sobe sua própria JVM, então o pico de memória é
+# ~CK_WORKERS × heap de CK_JVM_OPTS (4 × 2 GB): aumente só se houver RAM livre
+CK_WORKERS = min(os.cpu_count() or 1, 4)
+AGGREGATE_WORKERS = 1               # threads da etapa de agregação (pandas)
+PIPELINE_QUEUE_SIZE = 8             # capacidade de cada fila entre etapas
+PIPELINE_REPORT_INTERVAL = 30.0     # segundos entre relatórios de profundidade das filas
+RUN_JOURNAL = "lab02_run_journal.jsonl"  # diário de etapas concluídas (para retomar execuções)
+SUMMARY_FLUSH_EVERY = 25            # linhas por lote gravado em CONSOLIDATED_CSV durante a execução
+SUMMARY_FLUSH_INTERVAL = 30.0       # ou a cada N segundos, o que vier primeiro
+STREAMING_SUMMARY = True            # chunks de pandas (memória limitada); False: read_ck_csv de uma vez
+SUMMARY_COLUMNS = ["repo", "stars", "age_years", "releases", "CBO_mean", "CBO_std", "DIT_mean", "LCOM_mean"]
+SUMMARY_DTYPES = {
+    "repo": "string", "stars": "Int64", "age_years": "float64", "releases": "Int64",
+    "CBO_mean": "float64", "CBO_std": "float64", "DIT_mean": "float64", "LCOM_mean": "float64",
+}
+OUTPUT_FORMAT = "csv"               # "parquet" ou "feather" (requer pyarrow) para saídas tipadas
+EXPORT_CSV = True                   # com OUTPUT_FORMAT binário, grava também o CSV
 # -----------------------
 
 if TOKEN == "sua_token_aqui" or not TOKEN or TOKEN == "key":
@@ -56,27 +108,64 @@ headers = {
 }
 
 
-def graphql_query(query: str, max_retries: int = 3, backoff: float = 5.0):
+RATE_SCHEDULER = RateScheduler()
+
+_session = None
+_session_pid = None
+_session_lock = threading.Lock()
+
+
+def get_session(pool_size=HTTP_POOL_SIZE):
+    """Sessão HTTP persistente (keep-alive + pool de conexões), uma por processo.
+
+    O pid é verificado para que processos filhos não reaproveitem sockets
+    herdados do processo pai via fork.
+    """
+    global _session, _session_pid
+    with _session_lock:
+        if _session is None or _session_pid != os.getpid():
+            session = requests.Session()
+            session.headers.update(headers)
+            adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_size, max_retries=0)
+            session.mount("https://", adapter)
+            _session = session
+            _session_pid = os.getpid()
+        return _session
+
+
+def graphql_query(query: str, max_retries: int = 5):
     for attempt in range(1, max_retries + 1):
-        resp = requests.post(GITHUB_GRAPHQL_URL, json={"query": query}, headers=headers)
+        RATE_SCHEDULER.acquire("graphql")
+        resp = get_session().post(GITHUB_GRAPHQL_URL, json={"query": query})
+        RATE_SCHEDULER.update_from_headers(resp.headers, "graphql")
         print(f"GraphQL request status: {resp.status_code} (attempt {attempt})")
         if resp.status_code == 200:
             data = resp.json()
             if "errors" in data:
+                if any(e.get("type") == "RATE_LIMITED" for e in data["errors"]) and attempt < max_retries:
+                    RATE_SCHEDULER.penalize("graphql", attempt)
+                    continue
                 raise RuntimeError(f"GraphQL errors: {data['errors']}")
+            rl = (data.get("data") or {}).get("rateLimit")
+            if rl:
+                RATE_SCHEDULER.update_from_graphql(rl)
             return data
-        elif resp.status_code == 502 and attempt < max_retries:
-            time.sleep(backoff)
-            continue
         elif resp.status_code == 401:
             raise RuntimeError("401 Unauthorized — verifique seu token do GitHub.")
         else:
-            print("Resposta:", resp.text[:400])
-            time.sleep(backoff)
+            if resp.status_code not in (403, 429, 502):
+                print("Resposta:", resp.text[:400])
+            # 403/429 já trazem retry-after/x-ratelimit-reset; o backoff cobre os demais casos
+            delay = RATE_SCHEDULER.penalize("graphql", attempt)
+            print(f"Aguardando ~{delay:.1f}s antes de tentar novamente...")
     raise RuntimeError("Falha ao executar GraphQL após múltiplas tentativas.")
 
 
-def fetch_top_java_repos(total=1000, per_page=50):
+SEARCH_QUERY = "language:Java sort:stars-desc"
+
+
+def _search_repos(search_query, total, per_page=50, label="", collected_at=None):
+    """Percorre o cursor de uma busca GraphQL até coletar `total` repositórios."""
     repos = []
     cursor = None
     collected = 0
@@ -87,7 +176,7 @@ def fetch_top_java_repos(total=1000, per_page=50):
         after = f', after: "{cursor}"' if cursor else ""
         query = f"""
         {{
-          search(query: "language:Java sort:stars-desc", type: REPOSITORY, first: {first}{after}) {{
+          search(query: "{search_query}", type: REPOSITORY, first: {first}{after}) {{
             pageInfo {{
               endCursor
               hasNextPage
@@ -102,6 +191,11 @@ def fetch_top_java_repos(total=1000, per_page=50):
                   stargazerCount
                   primaryLanguage {{ name }}
                   releases {{ totalCount }}
+                  diskUsage
+                  defaultBranchRef {{
+                    name
+                    target {{ oid }}
+                  }}
                 }}
               }}
             }}
@@ -123,7 +217,7 @@ def fetch_top_java_repos(total=1000, per_page=50):
         edges = search.get("edges", [])
         for e in edges:
             node = e["node"]
-            repos.append(node)
+            repos.append(flatten_repo(node, collected_at))
             collected += 1
             if collected >= total:
                 break
@@ -134,49 +228,306 @@ def fetch_top_java_repos(total=1000, per_page=50):
 
         rl = data.get("data", {}).get("rateLimit")
         if rl:
-            print(f"RateLimit remaining: {rl.get('remaining')} resetAt: {rl.get('resetAt')}")
+            print(f"{label}RateLimit remaining: {rl.get('remaining')} resetAt: {rl.get('resetAt')}")
 
-        print(f"Página {page}: coletados até agora {collected}/{total}")
+        print(f"{label}Página {page}: coletados até agora {collected}/{total}")
         page += 1
         if not has_next:
             break
-        time.sleep(SLEEP_BETWEEN_PAGES)
 
     return repos[:total]
 
 
-def save_repos_csv(repos, filename=OUTPUT_REPOS_CSV):
-    df = pd.DataFrame(repos)
+def fetch_top_java_repos(total=1000, per_page=50):
+    collected_at = collection_timestamp().isoformat()
+    return _search_repos(SEARCH_QUERY, total, per_page, collected_at=collected_at)
+
+
+def build_star_ranges(min_stars=STAR_RANGE_MIN, max_stars=STAR_RANGE_MAX, shards=STAR_SHARDS):
+    """Divide [min_stars, max_stars] em faixas disjuntas com espaçamento logarítmico.
+
+    A distribuição de estrelas é de cauda longa, então faixas geométricas deixam
+    cada shard com uma quantidade de repositórios mais parecida. A última faixa
+    fica aberta (`stars:>=a`) para não perder os repositórios mais populares.
+    """
+    if shards < 1 or min_stars < 1 or max_stars <= min_stars:
+        raise ValueError("Faixas de estrelas inválidas.")
+    ratio = (max_stars / min_stars) ** (1.0 / shards)
+    bounds = [min_stars]
+    for i in range(1, shards):
+        b = int(round(min_stars * ratio ** i))
+        if b > bounds[-1]:
+            bounds.append(b)
+    ranges = [(lo, hi - 1) for lo, hi in zip(bounds, bounds[1:])]
+    ranges.append((bounds[-1], None))
+    return ranges
+
+
+def _stars_filter(lo, hi):
+    return f"stars:>={lo}" if hi is None else f"stars:{lo}..{hi}"
+
+
+def count_repos(search_query):
+    """repositoryCount de uma busca (uma consulta barata, sem percorrer resultados)."""
+    query = f"""
+    query {{
+      search(query: "{search_query}", type: REPOSITORY, first: 1) {{
+        repositoryCount
+      }}
+    }}
+    """
+    data = graphql_query(query)
+    return ((data.get("data") or {}).get("search") or {}).get("repositoryCount", 0)
+
+
+def _split_range(lo, hi):
+    """Divide uma faixa ao meio (geométrico); faixa aberta dobra o limite inferior."""
+    mid = lo * 2 if hi is None else max(lo + 1, int(round(math.sqrt(lo * (hi + 1)))))
+    return (mid, hi), (lo, mid - 1)
+
+
+def plan_star_ranges(total, star_ranges=None, cap=SEARCH_RESULT_CAP):
+    """Escolhe as faixas a percorrer, da mais popular para a menos popular.
+
+    Cada faixa tem seu repositoryCount consultado; faixas acima de `cap` são
+    divididas até caberem no limite da busca. O planejamento para assim que as
+    faixas já escolhidas somam `total` repositórios. Retorna [(lo, hi, n)],
+    onde n é quantos resultados ler da faixa (os mais estrelados dela).
+    """
+    pending = sorted(star_ranges or build_star_ranges(), key=lambda r: r[0])
+    plan = []
+    planned = 0
+    while pending and planned < total:
+        lo, hi = pending.pop()  # maior faixa restante
+        count = count_repos(f"language:Java {_stars_filter(lo, hi)}")
+        if count > cap and (hi is None or hi > lo):
+            upper, lower = _split_range(lo, hi)
+            pending.extend([lower, upper])
+            continue
+        if count > cap:
+            print(f"⚠️ [{_stars_filter(lo, hi)}] {count} repositórios numa faixa indivisível; só {cap} serão lidos.")
+        need = min(count, cap, total - planned)
+        if need > 0:
+            plan.append((lo, hi, need))
+            planned += need
+    if planned < total:
+        print(f"⚠️ Só {planned} repositórios Java nas faixas pesquisadas (pedido: {total}).")
+    return plan
+
+
+def fetch_top_java_repos_sharded(total=1000, per_page=50, star_ranges=None, max_workers=FETCH_WORKERS):
+    """Busca os repositórios em faixas `stars:a..b` disjuntas, em paralelo.
+
+    As faixas são planejadas por plan_star_ranges: nenhuma passa do limite de
+    1000 resultados da busca (então o total pode passar de 1000 sem lacunas) e
+    só são lidos os resultados necessários, do topo para baixo. O resultado é
+    deduplicado por nameWithOwner e reordenado por estrelas.
+    """
+    collected_at = collection_timestamp().isoformat()
+    plan = plan_star_ranges(total, star_ranges)
+
+    def run_shard(lo, hi, need):
+        stars = _stars_filter(lo, hi)
+        return _search_repos(f"language:Java {stars} sort:stars-desc", need, per_page, f"[{stars}] ", collected_at)
+
+    repos_by_name = {}
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = [executor.submit(run_shard, lo, hi, need) for lo, hi, need in plan]
+        for future in as_completed(futures):
+            for node in future.result():
+                repos_by_name.setdefault(node["nameWithOwner"], node)
+
+    repos = sorted(repos_by_name.values(), key=lambda r: r.get("stargazerCount") or 0, reverse=True)
+    print(f"Busca em {len(plan)} faixas: {len(repos)} repositórios únicos")
+    return repos[:total]
+
+
+def save_repos_csv(repos, filename=OUTPUT_REPOS_CSV, fmt=OUTPUT_FORMAT):
+    """Salva os registros planos (ver repo_schema) com colunas tipadas.
+
+    Para ler de volta sem reinferir tipos, use repo_schema.load_repos.
+    """
+    df = repos_to_frame(repos)
+    if fmt != "csv":
+        typed = write_table(df, with_format(filename, fmt), fmt)
+        print(f"✅ Lista de repositórios salva em {typed} ({len(df)} linhas)")
+        if not EXPORT_CSV:
+            return
     df.to_csv(filename, index=False, encoding="utf-8")
     print(f"✅ Lista de repositórios salva em {filename} ({len(df)} linhas)")
 
 
-def download_repo_zip(repo_full_name, dest_dir: Path):
-    """Baixa o repositório como ZIP usando a branch padrão do GitHub."""
+def repo_archive_ref(repo):
+    """Extrai (branch padrão, OID do último commit) do registro do repositório."""
+    return repo.get("default_branch"), repo.get("head_oid")
+
+
+def read_source_oid(target: Path):
+    """Commit de onde vieram os fontes em `target` (marcador gravado na extração)."""
+    try:
+        return (target / SOURCE_OID_FILE).read_text(encoding="utf-8").strip()
+    except OSError:
+        return None
+
+
+def download_repo_zip(repo_full_name, dest_dir: Path, default_branch=None, commit_oid=None, reserve=None):
+    """Baixa o repositório como ZIP.
+
+    Usa o commit/branch já obtidos na busca GraphQL; só consulta a API REST
+    quando o registro não trouxe `default_branch`. Se `reserve` for dado, é
+    chamado com o total de bytes a extrair antes da extração.
+    """
     dest_dir.mkdir(parents=True, exist_ok=True)
     target = dest_dir / repo_full_name.replace("/", "_")
     if target.exists():
-        print(f"Repositório {repo_full_name} já baixado em {target}, pulando download.")
-        return target
-
-    # Consulta a API para descobrir a branch padrão
-    api_url = f"https://api.github.com/repos/{repo_full_name}"
-    resp = requests.get(api_url, headers=headers)
-    if resp.status_code != 200:
-        raise RuntimeError(f"Falha ao obter info de {repo_full_name} ({resp.status_code})")
-    default_branch = resp.json().get("default_branch", "main")
-
-    zip_url = f"https://github.com/{repo_full_name}/archive/refs/heads/{default_branch}.zip"
-    print(f"Baixando ZIP de {repo_full_name} (branch padrão: {default_branch})...")
-    resp = requests.get(zip_url, headers=headers)
-    if resp.status_code != 200:
-        raise RuntimeError(f"Falha ao baixar {repo_full_name} ({resp.status_code})")
-    
-    with zipfile.ZipFile(BytesIO(resp.content)) as zf:
-        zf.extractall(target)
+        if not commit_oid or read_source_oid(target) == commit_oid:
+            print(f"Repositório {repo_full_name} já baixado em {target}, pulando download.")
+            return target
+        # fontes de outro commit (ou sem marcador): baixa o snapshot atual
+        print(f"Repositório {repo_full_name} em {target} não é do commit {commit_oid[:10]}, baixando de novo.")
+        shutil.rmtree(target)
+
+    if commit_oid:
+        # fixa o snapshot no commit visto durante a coleta
+        zip_url = f"https://github.com/{repo_full_name}/archive/{commit_oid}.zip"
+        ref_desc = f"commit {commit_oid[:10]}"
+    else:
+        if not default_branch:
+            # Consulta a API para descobrir a branch padrão
+            api_url = f"https://api.github.com/repos/{repo_full_name}"
+            RATE_SCHEDULER.acquire("core")
+            resp = get_session().get(api_url)
+            RATE_SCHEDULER.update_from_headers(resp.headers, "core")
+            if resp.status_code != 200:
+                raise RuntimeError(f"Falha ao obter info de {repo_full_name} ({resp.status_code})")
+            default_branch = resp.json().get("default_branch", "main")
+        zip_url = f"https://github.com/{repo_full_name}/archive/refs/heads/{default_branch}.zip"
+        ref_desc = f"branch padrão: {default_branch}"
+
+    print(f"Baixando ZIP de {repo_full_name} ({ref_desc})...")
+    RATE_SCHEDULER.acquire("archive")
+    with get_session().get(zip_url, stream=True) as resp:
+        if resp.status_code != 200:
+            raise RuntimeError(f"Falha ao baixar {repo_full_name} ({resp.status_code})")
+        archive = stream_to_spool(resp)
+
+    # extrai numa pasta temporária e renomeia no fim: `target` só existe completo
+    partial = target.with_name(target.name + ".partial")
+    shutil.rmtree(partial, ignore_errors=True)
+    with archive, zipfile.ZipFile(archive) as zf:
+        if EXTRACT_ONLY_SOURCES:
+            extract_sources(zf, partial, reserve=reserve)
+        else:
+            extract_sources(zf, partial, include=["*"], exclude=[], reserve=reserve)
+    if commit_oid:
+        (partial / SOURCE_OID_FILE).write_text(commit_oid, encoding="utf-8")
+    os.replace(partial, target)
     return target
 
 
+def extract_sources(zf, target, include=EXTRACT_INCLUDE, exclude=EXTRACT_EXCLUDE, reserve=None):
+    """Extrai só os membros do ZIP que casam com `include` e não casam com `exclude`.
+
+    Os padrões são globs (fnmatch) aplicados ao caminho dentro do ZIP, em que
+    `*` também casa com `/` (ex.: "*/src/test/*").
+    """
+    members = []
+    for info in zf.infolist():
+        if info.is_dir():
+            continue
+        name = info.filename
+        if not any(fnmatch.fnmatchcase(name, pat) for pat in include):
+            continue
+        if any(fnmatch.fnmatchcase(name, pat) for pat in exclude):
+            continue
+        members.append(info)
+
+    if reserve is not None:
+        reserve(sum(info.file_size for info in members))
+    target.mkdir(parents=True, exist_ok=True)
+    for info in members:
+        zf.extract(info, target)
+    print(f"Extraídos {len(members)} de {len(zf.infolist())} arquivos em {target}")
+    return len(members)
+
+
+class ScratchBudget:
+    """Teto de bytes extraídos no scratch, compartilhado entre as threads de download."""
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.used = 0
+        self.cond = threading.Condition()
+
+    def reserve(self, nbytes):
+        # um repo maior que o teto ainda roda, mas sozinho
+        with self.cond:
+            while self.used > 0 and self.used + nbytes > self.max_bytes:
+                self.cond.wait()
+            self.used += nbytes
+
+    def release(self, nbytes):
+        with self.cond:
+            self.used -= nbytes
+            self.cond.notify_all()
+
+
+class ScratchArea:
+    """Diretório efêmero para os fontes de um repo, apagado (e liberado do teto) na saída."""
+
+    def __init__(self, base_dir=None, budget=None):
+        self.base_dir = base_dir
+        self.budget = budget
+        self.reserved = 0
+        self.path = None
+
+    def reserve(self, nbytes):
+        if self.budget is not None:
+            self.budget.reserve(nbytes)
+        self.reserved += nbytes
+
+    def create(self):
+        self.path = Path(tempfile.mkdtemp(prefix="lab02_", dir=self.base_dir))
+        return self
+
+    def cleanup(self):
+        shutil.rmtree(self.path, ignore_errors=True)
+        if self.budget is not None and self.reserved:
+            self.budget.release(self.reserved)
+            self.reserved = 0
+
+    def __enter__(self):
+        return self.create()
+
+    def __exit__(self, *exc):
+        self.cleanup()
+        return False
+
+
+def stream_to_spool(resp, chunk_size=DOWNLOAD_CHUNK_SIZE, max_memory=SPOOL_MAX_BYTES):
+    """Grava o corpo da resposta em blocos num arquivo temporário.
+
+    Até `max_memory` bytes o conteúdo fica em memória; acima disso vai para o
+    disco, então o uso de memória por worker não depende do tamanho do repo.
+    """
+    expected = resp.headers.get("Content-Length")
+    if resp.headers.get("Content-Encoding"):
+        expected = None  # o tamanho do corpo decodificado difere do Content-Length
+    spool = tempfile.SpooledTemporaryFile(max_size=max_memory, dir=SPOOL_DIR)
+    written = 0
+    try:
+        for chunk in resp.iter_content(chunk_size=chunk_size):
+            spool.write(chunk)
+            written += len(chunk)
+        if expected is not None and written != int(expected):
+            raise RuntimeError(f"Download incompleto: {written} de {expected} bytes")
+    except BaseException:
+        spool.close()
+        raise
+    spool.seek(0)
+    return spool
+
+
 
 def ensure_ck_is_built(ck_dir=CK_REPO_DIR):
     if ck_dir.exists():
@@ -206,99 +557,382 @@ def ensure_ck_is_built(ck_dir=CK_REPO_DIR):
     return jars[0].resolve()
 
 
+class CKAnalysisError(RuntimeError):
+    """O CK rejeitou o projeto ("CKSERVER ERR"); a JVM continua utilizável."""
+
+
+class CKServer:
+    """JVM do CK mantida viva entre repositórios (ver java/CKServer.java).
+
+    Cada pedido é uma linha com os argumentos do Runner separados por TAB;
+    a resposta é uma linha "CKSERVER OK" ou "CKSERVER ERR <mensagem>".
+    """
+
+    def __init__(self, ck_jar_path: Path):
+        cmd = ["java", *CK_JVM_OPTS, "-cp", str(ck_jar_path), str(CK_SERVER_SOURCE)]
+        print("Iniciando servidor CK:", " ".join(cmd))
+        self.proc = subprocess.Popen(
+            cmd, stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+            text=True, encoding="utf-8", bufsize=1,
+        )
+
+    def analyze(self, ck_args):
+        if self.proc.poll() is not None:
+            raise RuntimeError(f"Servidor CK encerrado (código {self.proc.returncode})")
+        self.proc.stdin.write("\t".join(ck_args) + "\n")
+        self.proc.stdin.flush()
+        while True:
+            line = self.proc.stdout.readline()
+            if not line:
+                raise RuntimeError("Servidor CK encerrou durante a análise")
+            if line.startswith("CKSERVER "):
+                break
+        if not line.startswith("CKSERVER OK"):
+            raise CKAnalysisError(line.strip()[len("CKSERVER ERR "):])
+
+    def close(self):
+        try:
+            self.proc.stdin.close()
+            self.proc.wait(timeout=10)
+        except (OSError, subprocess.TimeoutExpired):
+            self.proc.kill()
+
+
+_ck_local = threading.local()
+_ck_servers = []
+_ck_servers_lock = threading.Lock()
+
+
+def get_ck_server(ck_jar_path: Path):
+    """Servidor CK da thread atual, iniciado no primeiro uso."""
+    server = getattr(_ck_local, "server", None)
+    if server is None:
+        server = CKServer(ck_jar_path)
+        _ck_local.server = server
+        with _ck_servers_lock:
+            _ck_servers.append(server)
+    return server
+
+
+def close_ck_servers():
+    with _ck_servers_lock:
+        for server in _ck_servers:
+            server.close()
+        _ck_servers.clear()
+
+
 def run_ck_on_project(ck_jar_path: Path, project_dir: Path, output_dir: Path):
     output_dir.mkdir(parents=True, exist_ok=True)
-    cmd = [
-        "java", "-jar", str(ck_jar_path),
+    ck_args = [
         str(project_dir),
         "false",  # use jars
         "0",      # max files
         "false",  # variables and fields
-        str(output_dir)
+        str(output_dir) + os.sep  # o CK usa este valor como prefixo dos CSVs
     ]
+    if CK_PERSISTENT_JVM:
+        try:
+            print(f"Executando CK (JVM persistente) em {project_dir}")
+            get_ck_server(ck_jar_path).analyze(ck_args)
+            return
+        except CKAnalysisError:
+            # erro do próprio projeto: mantém a JVM e não repete a análise com java -jar
+            raise
+        except (OSError, RuntimeError) as e:
+            # descarta o servidor; o próximo repo sobe uma JVM nova
+            print(f"⚠️ Servidor CK falhou ({e}), usando java -jar para {project_dir}")
+            server = getattr(_ck_local, "server", None)
+            if server is not None:
+                server.close()
+            _ck_local.server = None
+
+    cmd = ["java", "-jar", str(ck_jar_path), *ck_args]
     print("Executando CK:", " ".join(cmd))
     subprocess.run(cmd, check=True)
 
 
-def idade_anos(iso):
-    try:
-        created = datetime.fromisoformat(iso.replace("Z", "+00:00"))
-        delta = datetime.now(timezone.utc) - created
-        return round(delta.total_seconds() / (3600 * 24 * 365), 2)
-    except Exception:
-        return None
+def idade_anos(iso, reference=None):
+    age = age_years([iso], reference)[0]
+    return None if math.isnan(age) else round(age, 2)
 
 
-from concurrent.futures import ProcessPoolExecutor, as_completed
-
-def process_single_repo(repo, clones_dir, ck_output_base, ck_jar):
+def stage_download(repo, clones_dir, scratch_budget=None):
+    """Baixa e extrai o repo. Retorna (pasta com os fontes, ScratchArea ou None)."""
     repo_full_name = repo["nameWithOwner"]
+    area = ScratchArea(SCRATCH_DIR, scratch_budget).create() if EPHEMERAL_SOURCES else None
     try:
-        cloned_path = download_repo_zip(repo_full_name, clones_dir)
-        # Ajusta para acessar a pasta descompactada
-        extracted_subdir = next(cloned_path.iterdir())
-        repo_safe_name = repo_full_name.replace("/", "_")
-        ck_result_dir = ck_output_base / repo_safe_name
-        run_ck_on_project(ck_jar, extracted_subdir, ck_result_dir)
-
-        classes_csv = ck_result_dir / "classes.csv"
-        if not classes_csv.exists():
-            print(f"⚠️ Nenhum classes.csv para {repo_full_name}, pulando.")
-            return None
-
-        df = pd.read_csv(classes_csv)
+        default_branch, commit_oid = repo_archive_ref(repo)
+        cloned_path = download_repo_zip(
+            repo_full_name, area.path if area else clones_dir, default_branch, commit_oid,
+            reserve=area.reserve if area else None,
+        )
+        # Ajusta para acessar a pasta descompactada (ignora o marcador SOURCE_OID_FILE)
+        extracted_subdir = next((p for p in cloned_path.iterdir() if p.is_dir()), None)
+    except BaseException:
+        if area:
+            area.cleanup()
+        raise
+    if extracted_subdir is None:
+        print(f"⚠️ Nenhum arquivo Java em {repo_full_name}, pulando.")
+        if area:
+            area.cleanup()
+        return None, None
+    return extracted_subdir, area
+
+
+def stage_ck(repo, sources_dir, ck_output_base, ck_jar):
+    ck_result_dir = ck_output_base / repo["nameWithOwner"].replace("/", "_")
+    run_ck_on_project(ck_jar, sources_dir, ck_result_dir)
+    return ck_result_dir
+
+
+def repo_fields(repo):
+    """Colunas da linha consolidada que vêm da coleta (não do CK)."""
+    return {
+        "repo": repo["nameWithOwner"],
+        "stars": repo.get("stargazerCount"),
+        "age_years": repo["age_years"] if "age_years" in repo else idade_anos(repo.get("createdAt"), repo.get("collected_at")),
+        "releases": repo.get("releases_count"),
+    }
+
+
+def same_commit(entry, repo):
+    """A etapa do diário foi feita no commit atual do repo? (sem head_oid: assume que sim)"""
+    oid = entry.get("head_oid")
+    return not oid or not repo.get("head_oid") or oid == repo["head_oid"]
+
+
+def stage_summarize(repo, ck_result_dir):
+    repo_full_name = repo["nameWithOwner"]
+    classes_csv = ck_result_dir / "class.csv"
+    if not classes_csv.exists():
+        print(f"⚠️ Nenhum class.csv para {repo_full_name}, pulando.")
+        return None
 
-        summary = {
-            "repo": repo_full_name,
-            "stars": repo.get("stargazerCount"),
-            "age_years": idade_anos(repo.get("createdAt")),
-            "releases": (repo.get("releases") or {}).get("totalCount"),
+    summary = repo_fields(repo)
+    if STREAMING_SUMMARY:
+        # uma passada em chunks (memória limitada ao chunk), só cbo/dit/lcom
+        _, stats = summarize_csv(classes_csv, ["cbo", "dit", "lcom"])
+        cbo, dit, lcom = (stats.get(c) or ColumnStats() for c in ("cbo", "dit", "lcom"))
+        summary.update({
+            "CBO_mean": cbo.mean,
+            "CBO_std": cbo.std(),
+            "DIT_mean": dit.mean,
+            "LCOM_mean": lcom.mean,
+        })
+    else:
+        df = read_ck_csv(classes_csv, ["cbo", "dit", "lcom"])
+        summary.update({
             "CBO_mean": df["cbo"].mean(),
             "CBO_std": df["cbo"].std(),
             "DIT_mean": df["dit"].mean(),
             "LCOM_mean": df["lcom"].mean(),
-        }
-        return summary
-    except Exception as e:
-        print(f"❌ Erro ao processar {repo_full_name}: {e}")
-        return None
-
-def process_all_repos_parallel(repos, clones_dir=CLONES_DIR, ck_output_base=CK_OUTPUT_BASE, ck_dir=CK_REPO_DIR, max_workers=4):
+        })
+    return summary
+
+
+_STOP = object()
+
+
+class PipelineStage:
+    """Etapa do pipeline: `workers` threads lendo de `inbox` e escrevendo em `outbox`.
+
+    `func(job)` devolve o job para a próxima etapa, ou None quando o repositório
+    sai do pipeline (pulado ou com erro).
+    """
+
+    def __init__(self, name, func, workers, inbox, outbox, on_exit):
+        self.name = name
+        self.func = func
+        self.inbox = inbox
+        self.outbox = outbox
+        self.on_exit = on_exit
+        self.busy = 0
+        self.lock = threading.Lock()
+        self.threads = [
+            threading.Thread(target=self._loop, name=f"{name}-{i}", daemon=True)
+            for i in range(workers)
+        ]
+
+    def start(self):
+        for t in self.threads:
+            t.start()
+
+    def stop(self):
+        """Espera a fila de entrada esvaziar e encerra as threads."""
+        for _ in self.threads:
+            self.inbox.put(_STOP)
+        for t in self.threads:
+            t.join()
+
+    def _loop(self):
+        while True:
+            job = self.inbox.get()
+            if job is _STOP:
+                return
+            with self.lock:
+                self.busy += 1
+            try:
+                result = self.func(job)
+            except Exception as e:
+                print(f"❌ Erro ao processar {job['repo']['nameWithOwner']} (etapa {self.name}): {e}")
+                result = None
+            finally:
+                with self.lock:
+                    self.busy -= 1
+            if result is None or self.outbox is None:
+                self.on_exit(job)
+            else:
+                self.outbox.put(result)
+
+
+def process_all_repos_parallel(repos, clones_dir=CLONES_DIR, ck_output_base=CK_OUTPUT_BASE, ck_dir=CK_REPO_DIR,
+                               download_workers=DOWNLOAD_WORKERS, ck_workers=CK_WORKERS,
+                               aggregate_workers=AGGREGATE_WORKERS, queue_size=PIPELINE_QUEUE_SIZE,
+                               journal_path=RUN_JOURNAL, output_format=OUTPUT_FORMAT):
+    """Pipeline download -> CK -> agregação com filas limitadas entre as etapas.
+
+    O download é I/O (threads), o CK roda em JVMs externas (uma por thread da
+    etapa, limitada por CK_WORKERS por causa da memória) e a agregação é leve. Enquanto um repo
+    está no CK, os próximos já estão sendo baixados, até `queue_size` de folga.
+
+    Cada etapa concluída vai para o diário em `journal_path`; ao reexecutar,
+    repos já resumidos no mesmo commit (head_oid) são reaproveitados, com
+    estrelas/idade/releases atualizadas, e repos com CK pronto vão direto
+    para a agregação.
+    """
     try:
         ck_jar = ensure_ck_is_built(ck_dir)
     except RuntimeError as e:
         print("Erro ao preparar CK:", e)
         return
 
-    results = []
+    # idade de todos os repos numa única passada vetorizada, relativa ao momento da coleta
+    reference = next((r["collected_at"] for r in repos if r.get("collected_at")), None)
+    ages = np.round(age_years([r.get("createdAt") for r in repos], reference), 2)
+    repos = [dict(r, age_years=None if np.isnan(a) else float(a)) for r, a in zip(repos, ages)]
+
+    journal = RunJournal(journal_path)
+    summaries = IncrementalCSVWriter(CONSOLIDATED_CSV, SUMMARY_COLUMNS, SUMMARY_FLUSH_EVERY, SUMMARY_FLUSH_INTERVAL)
     total_repos = len(repos)
+    done = [0]
+    done_lock = threading.Lock()
+    scratch_budget = ScratchBudget(SCRATCH_MAX_BYTES) if EPHEMERAL_SOURCES else None
+
+    download_q = queue.Queue(maxsize=queue_size)
+    ck_q = queue.Queue(maxsize=queue_size)
+    aggregate_q = queue.Queue(maxsize=queue_size)
+
+    def queue_depths():
+        return f"filas download={download_q.qsize()} ck={ck_q.qsize()} agregação={aggregate_q.qsize()}"
+
+    def finish(job):
+        with done_lock:
+            done[0] += 1
+            i = done[0]
+        remaining = total_repos - i
+        print(f"[{i}/{total_repos}] Concluído {job['repo']['nameWithOwner']} — Faltam {remaining} repositórios... ({queue_depths()})")
+
+    def do_download(job):
+        repo_full_name = job["repo"]["nameWithOwner"]
+        sources_dir, area = stage_download(job["repo"], clones_dir, scratch_budget)
+        if sources_dir is None:
+            journal.record(repo_full_name, "summary", summary=None, head_oid=job["repo"].get("head_oid"))
+            return None
+        journal.record(repo_full_name, "download", sources_dir=str(sources_dir), head_oid=job["repo"].get("head_oid"))
+        return dict(job, sources_dir=sources_dir, area=area)
+
+    def do_ck(job):
+        try:
+            ck_result_dir = stage_ck(job["repo"], job["sources_dir"], ck_output_base, ck_jar)
+        finally:
+            if job["area"]:
+                job["area"].cleanup()
+        journal.record(job["repo"]["nameWithOwner"], "ck", ck_result_dir=str(ck_result_dir),
+                       head_oid=job["repo"].get("head_oid"))
+        return dict(job, ck_result_dir=ck_result_dir)
+
+    def do_aggregate(job):
+        summary = stage_summarize(job["repo"], job["ck_result_dir"])
+        journal.record(job["repo"]["nameWithOwner"], "summary", summary=summary,
+                       head_oid=job["repo"].get("head_oid"))
+        if summary:
+            summaries.add(summary)
+        return None
 
-    with ProcessPoolExecutor(max_workers=max_workers) as executor:
-        future_to_repo = {executor.submit(process_single_repo, repo, clones_dir, ck_output_base, ck_jar): repo for repo in repos}
+    stages = [
+        PipelineStage("download", do_download, download_workers, download_q, ck_q, finish),
+        PipelineStage("ck", do_ck, ck_workers, ck_q, aggregate_q, finish),
+        PipelineStage("agregação", do_aggregate, aggregate_workers, aggregate_q, None, finish),
+    ]
 
-        for i, future in enumerate(as_completed(future_to_repo), start=1):
-            repo = future_to_repo[future]
+    stop_monitor = threading.Event()
+
+    def monitor():
+        # acorda no menor dos dois intervalos: relatório das filas e lote pendente do CSV
+        tick = min(PIPELINE_REPORT_INTERVAL, SUMMARY_FLUSH_INTERVAL)
+        next_report = time.monotonic() + PIPELINE_REPORT_INTERVAL
+        while not stop_monitor.wait(tick):
+            summaries.flush_if_due()
+            if time.monotonic() >= next_report:
+                next_report += PIPELINE_REPORT_INTERVAL
+                busy = " ".join(f"{st.name}={st.busy}" for st in stages)
+                print(f"⏱️  Pipeline: {queue_depths()} | em execução {busy}")
+
+    threading.Thread(target=monitor, daemon=True).start()
+    for st in stages:
+        st.start()
+    resumed = 0
+    try:
+        for repo in repos:
             repo_full_name = repo["nameWithOwner"]
-            remaining = total_repos - i
-            print(f"[{i}/{total_repos}] Concluído {repo_full_name} — Faltam {remaining} repositórios...")
-            res = future.result()
-            if res:
-                results.append(res)
-
-    results_df = pd.DataFrame(results)
-    results_df.to_csv(CONSOLIDATED_CSV, index=False, encoding="utf-8")
-    print(f"\n✅ Arquivo consolidado salvo em {CONSOLIDATED_CSV}")
+            summary_entry = journal.get(repo_full_name, "summary")
+            if summary_entry and same_commit(summary_entry, repo):
+                # métricas do CK do diário; estrelas/idade/releases da coleta atual
+                summary = summary_entry["summary"]
+                if summary:
+                    summaries.add(dict(summary, **repo_fields(repo)))
+                resumed += 1
+                finish({"repo": repo})
+                continue
+            ck_entry = journal.get(repo_full_name, "ck")
+            if ck_entry and same_commit(ck_entry, repo) and (Path(ck_entry["ck_result_dir"]) / "class.csv").exists():
+                resumed += 1
+                aggregate_q.put({"repo": repo, "ck_result_dir": Path(ck_entry["ck_result_dir"])})
+                continue
+            download_q.put({"repo": repo})
+        # encerra em ordem: cada etapa só para depois que a anterior esvaziou
+        for st in stages:
+            st.stop()
+    finally:
+        stop_monitor.set()
+        close_ck_servers()
+        journal.close()
+        rows = summaries.close()
+
+    if resumed:
+        print(f"♻️  {resumed} repositórios retomados do diário {journal_path}")
+    print(f"\n✅ Arquivo consolidado salvo em {CONSOLIDATED_CSV} ({rows} linhas)")
+
+    if output_format != "csv":
+        # o CSV é gravado incrementalmente; a versão tipada sai no fim da execução
+        df = pd.read_csv(CONSOLIDATED_CSV, dtype=SUMMARY_DTYPES)
+        typed = write_table(df, with_format(CONSOLIDATED_CSV, output_format), output_format)
+        print(f"✅ Arquivo consolidado salvo em {typed}")
 
 
 
 def main():
     print("=== Lab02S02: Coleta CK em todos os repositórios ===")
-    repos = fetch_top_java_repos(total=TOTAL_REPOS, per_page=PER_PAGE)
+    if SHARDED_FETCH:
+        repos = fetch_top_java_repos_sharded(total=TOTAL_REPOS, per_page=PER_PAGE)
+    else:
+        repos = fetch_top_java_repos(total=TOTAL_REPOS, per_page=PER_PAGE)
     if not repos:
         print("Nenhum repositório coletado. Abortando.")
         return
     save_repos_csv(repos, OUTPUT_REPOS_CSV)
-    process_all_repos_parallel(repos, max_workers=4)
+    process_all_repos_parallel(repos)
 
 
 
@@ -0,0 +1,95 @@
+"""
+charts.py
+
+Renderização dos gráficos de dispersão com a API orientada a objetos do
+Matplotlib (Figure + FigureCanvasAgg), sem o estado global do pyplot.
+
+Cada gráfico é descrito por um dicionário (spec) autocontido, então vários
+gráficos podem ser renderizados em paralelo num pool de processos. Specs
+com "hexbin" (contagens já agregadas, ver outofcore.HexBins) são desenhados
+como hexbin sem passar pelos pontos individuais; acima de DENSITY_THRESHOLD
+pontos, o spec é agregado antes do envio ao pool, então o tempo de cada
+gráfico depende do número de células, não do número de pontos.
+
+xscale/yscale = "log" desenham o eixo em escala log (métricas de cauda
+longa, como estrelas e LOC); valores <= 0 não aparecem nesses eixos.
+"""
+
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import seaborn as sns
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+
+from outofcore import HEX_GRIDSIZE, aggregate_hexbin
+
+FIGSIZE = (8, 6)
+DPI = 100
+DENSITY_THRESHOLD = 20000
+
+
+def prepare_spec(spec):
+    """Troca os pontos por um hexbin agregado quando passam de density_threshold."""
+    if spec.get("hexbin") is not None:
+        return spec
+    threshold = spec.get("density_threshold", DENSITY_THRESHOLD)
+    if threshold is None or len(spec["x"]) <= threshold:
+        return spec
+    hexbin = aggregate_hexbin(spec["x"], spec["y"], spec.get("gridsize", HEX_GRIDSIZE),
+                              spec.get("xscale", "linear"), spec.get("yscale", "linear"))
+    return dict(spec, x=[], y=[], hexbin=hexbin)
+
+
+def render_scatter(spec):
+    """Renderiza um spec e grava o PNG em spec["path"]. Retorna o caminho.
+
+    Campos do spec: x, y (arrays) ou hexbin (agregado), xlabel, ylabel,
+    title, path e, opcionalmente, corr/pval (anotados no título),
+    xscale/yscale e density_threshold (None = sempre dispersão).
+    """
+    spec = prepare_spec(spec)
+    fig = Figure(figsize=FIGSIZE, dpi=DPI)
+    FigureCanvasAgg(fig)
+    with sns.axes_style("whitegrid"):
+        ax = fig.subplots()
+    if spec.get("hexbin") is not None:
+        draw_hexbin(fig, ax, spec["hexbin"])
+    else:
+        sns.scatterplot(x=np.asarray(spec["x"]), y=np.asarray(spec["y"]), ax=ax)
+        ax.set_xscale(spec.get("xscale", "linear"))
+        ax.set_yscale(spec.get("yscale", "linear"))
+    ax.set_xlabel(spec["xlabel"])
+    ax.set_ylabel(spec["ylabel"])
+    title = spec["title"]
+    if spec.get("corr") is not None:
+        title = f"{title}\nSpearman: {spec['corr']:.2f} (p={spec['pval']:.3f})"
+    ax.set_title(title)
+    fig.tight_layout()
+    fig.savefig(spec["path"])
+    return spec["path"]
+
+
+def draw_hexbin(fig, ax, hexbin):
+    """Desenha contagens hexagonais pré-agregadas (centros + contagens)."""
+    if len(hexbin["counts"]) == 0:
+        return None
+    art = ax.hexbin(hexbin["x"], hexbin["y"], C=hexbin["counts"], gridsize=hexbin["gridsize"],
+                    extent=hexbin["extent"], reduce_C_function=np.sum, cmap="viridis", bins="log",
+                    xscale=hexbin.get("xscale", "linear"), yscale=hexbin.get("yscale", "linear"))
+    fig.colorbar(art, ax=ax, label="pontos por célula")
+    return art
+
+
+def render_charts(specs, workers=None):
+    """Renderiza todos os specs; com workers > 1 usa um pool de processos."""
+    for spec in specs:
+        os.makedirs(os.path.dirname(spec["path"]) or ".", exist_ok=True)
+    # agrega antes de enviar ao pool: só as células trafegam entre processos
+    specs = [prepare_spec(spec) for spec in specs]
+    workers = workers or os.cpu_count() or 1
+    if workers <= 1 or len(specs) <= 1:
+        return [render_scatter(spec) for spec in specs]
+    with ProcessPoolExecutor(max_workers=min(workers, len(specs))) as executor:
+        return list(executor.map(render_scatter, specs))
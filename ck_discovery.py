@@ -0,0 +1,107 @@
+"""
+ck_discovery.py
+
+Descoberta dos CSVs do CK em lab02_ck_results/, com índice persistente.
+
+Layouts reconhecidos:
+ - aninhado (atividade2.py): <raiz>/<owner_repo>/class.csv (+ method.csv)
+ - plano (legado):           <raiz>/<repo>.csv
+
+O índice guarda, por diretório, o mtime e a listagem; diretórios cujo mtime
+não mudou não são listados de novo. Ele fica fora da raiz indexada (por
+padrão, <raiz>.ck_index.json ao lado dela): gravá-lo dentro da raiz mudaria o
+mtime da raiz a cada execução e forçaria listar de novo justamente o maior
+diretório.
+"""
+
+import json
+import os
+from collections import namedtuple
+
+INDEX_NAME = ".ck_index.json"
+
+# signature: [tamanho, mtime_ns] do class.csv e do method.csv (ou None)
+CKOutput = namedtuple("CKOutput", "repo class_csv method_csv signature")
+
+
+def default_index_path(root):
+    """<raiz>.ck_index.json, ao lado da raiz (nunca dentro dela)."""
+    return os.path.normpath(root) + INDEX_NAME
+
+
+def load_index(index_path):
+    try:
+        with open(index_path, encoding="utf-8") as fh:
+            return json.load(fh)
+    except (OSError, ValueError):
+        return {"dirs": {}}
+
+
+def save_index(index_path, index):
+    tmp = index_path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as fh:
+        json.dump(index, fh)
+    os.replace(tmp, index_path)
+
+
+def _walk(root, old_dirs, new_dirs):
+    """Gera (diretório, [csvs]) reaproveitando a listagem de diretórios inalterados."""
+    stack = [root]
+    while stack:
+        path = stack.pop()
+        try:
+            mtime_ns = os.stat(path).st_mtime_ns
+        except OSError:
+            continue
+        cached = old_dirs.get(path)
+        if cached and cached["mtime_ns"] == mtime_ns:
+            files, subdirs = cached["files"], cached["subdirs"]
+        else:
+            files, subdirs = [], []
+            with os.scandir(path) as it:
+                for entry in it:
+                    if entry.is_dir(follow_symlinks=False):
+                        subdirs.append(entry.name)
+                    elif entry.name.endswith(".csv"):
+                        files.append(entry.name)
+        new_dirs[path] = {"mtime_ns": mtime_ns, "files": files, "subdirs": subdirs}
+        yield path, files
+        stack.extend(os.path.join(path, d) for d in subdirs)
+
+
+def _signature(path):
+    if path is None:
+        return None
+    st = os.stat(path)
+    return [st.st_size, st.st_mtime_ns]
+
+
+def discover_ck_outputs(root, index_path=None):
+    """Lista as saídas do CK sob `root`, ordenadas por repo.
+
+    Retorna (saídas, índice novo). O índice só deve ser gravado com save_index
+    depois que as saídas forem processadas com sucesso.
+    """
+    root = os.path.normpath(root)
+    index_path = index_path or default_index_path(root)
+    old = load_index(index_path)
+    new = {"dirs": {}}
+
+    found = []
+    for path, files in _walk(root, old.get("dirs", {}), new["dirs"]):
+        if "class.csv" in files:
+            repo = os.path.relpath(path, root).replace(os.sep, "_")
+            method_csv = os.path.join(path, "method.csv") if "method.csv" in files else None
+            found.append((repo, os.path.join(path, "class.csv"), method_csv))
+        elif path == root:
+            for name in files:
+                found.append((name[:-len(".csv")], os.path.join(path, name), None))
+
+    outputs = []
+    for repo, class_csv, method_csv in sorted(found):
+        try:
+            signature = [_signature(class_csv), _signature(method_csv)]
+        except OSError:
+            continue
+        outputs.append(CKOutput(repo, class_csv, method_csv, signature))
+    return outputs, new
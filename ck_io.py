@@ -0,0 +1,57 @@
+"""
+ck_io.py
+
+Leitura enxuta dos CSVs gerados pelo CK (class.csv / method.csv).
+
+O class.csv do CK tem dezenas de colunas; aqui só as colunas pedidas são
+lidas, já com dtypes compactos, e com o engine pyarrow quando disponível.
+"""
+
+import pandas as pd
+
+try:
+    import pyarrow  # noqa: F401
+    CSV_ENGINE = "pyarrow"
+except ImportError:
+    CSV_ENGINE = "c"
+
+# dtypes das métricas inteiras do CK usadas pelos scripts do laboratório
+CK_DTYPES = {
+    "cbo": "int32",
+    "cboModified": "int32",
+    "fanin": "int32",
+    "fanout": "int32",
+    "wmc": "int32",
+    "dit": "int16",
+    "noc": "int32",
+    "rfc": "int32",
+    "lcom": "int64",
+    "loc": "int32",
+    "loopQty": "int32",
+    "comparisonsQty": "int32",
+    "methodsInvokedQty": "int32",
+    "methodsInvokedLocalQty": "int32",
+    "methodsInvokedIndirectLocalQty": "int32",
+}
+
+
+def read_header(path):
+    with open(path, encoding="utf-8") as fh:
+        return fh.readline().rstrip("\r\n").split(",")
+
+
+def read_ck_csv(path, columns, dtypes=None, engine=None):
+    """Lê apenas `columns` de um CSV do CK (colunas ausentes são ignoradas)."""
+    dtypes = CK_DTYPES if dtypes is None else dtypes
+    engine = engine or CSV_ENGINE
+    header = read_header(path)
+    cols = [c for c in columns if c in header]
+    dtype = {c: dtypes[c] for c in cols if c in dtypes}
+    try:
+        return pd.read_csv(path, usecols=cols, dtype=dtype, engine=engine)
+    except (ValueError, TypeError, OverflowError):
+        # valores vazios/inválidos não cabem em int: lê sem dtype e converte com coerção
+        df = pd.read_csv(path, usecols=cols, engine=engine)
+        for c in dtype:
+            df[c] = pd.to_numeric(df[c], errors="coerce")
+        return df
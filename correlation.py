@@ -0,0 +1,160 @@
+"""
+correlation.py
+
+Correlações de Pearson e Spearman entre métricas de processo (x) e de
+qualidade (y), calculadas em bloco com NumPy.
+
+Em vez de chamar scipy.stats.spearmanr par a par (re-ranqueando as mesmas
+colunas a cada chamada), os pares são agrupados pelo padrão de valores
+ausentes: cada coluna é ranqueada uma única vez por grupo, e as matrizes
+inteiras de r saem de um produto matricial. Os p-valores vêm da
+distribuição t com n - 2 graus de liberdade (os mesmos do SciPy).
+"""
+
+import numpy as np
+import pandas as pd
+from scipy.special import stdtr
+from scipy.stats import rankdata
+
+from resampling import resample_summary
+
+ALPHA = 0.05
+
+# limites de |r| para a classificação usada no relatório
+STRENGTH_LABELS = [(0.3, "Muito fraca"), (0.5, "Fraca"), (0.7, "Moderada")]
+STRONGEST_LABEL = "Forte"
+
+
+def _numeric_matrix(df, cols):
+    return np.column_stack([pd.to_numeric(df[c], errors="coerce").to_numpy(dtype="float64", na_value=np.nan)
+                            for c in cols])
+
+
+def _pearson_block(X, Y):
+    """Matriz r (kx, ky) entre as colunas de X e Y, ambos sem NaN."""
+    Xc = X - X.mean(axis=0)
+    Yc = Y - Y.mean(axis=0)
+    den = np.sqrt((Xc ** 2).sum(axis=0))[:, None] * np.sqrt((Yc ** 2).sum(axis=0))[None, :]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        r = (Xc.T @ Yc) / den
+    return np.clip(r, -1.0, 1.0)
+
+
+def p_values(r, n):
+    """P-valor bicaudal de r via t = r * sqrt((n - 2) / (1 - r^2))."""
+    r = np.asarray(r, dtype="float64")
+    dof = np.asarray(n, dtype="float64") - 2
+    with np.errstate(divide="ignore", invalid="ignore"):
+        t = r * np.sqrt(dof / ((1.0 - r) * (1.0 + r)))
+        p = 2 * stdtr(dof, -np.abs(t))
+    return np.where(dof > 0, p, np.nan)
+
+
+def _mask_groups(vx, vy):
+    """Agrupa os pares (i, j) pela máscara de linhas válidas em comum."""
+    groups = {}
+    for i in range(vx.shape[1]):
+        for j in range(vy.shape[1]):
+            mask = vx[:, i] & vy[:, j]
+            key = np.packbits(mask).tobytes()
+            entry = groups.setdefault(key, (mask, []))
+            entry[1].append((i, j))
+    return groups.values()
+
+
+def correlation_matrix(df, x_cols, y_cols):
+    """Pearson e Spearman (r e p) para todos os pares x_cols × y_cols.
+
+    Retorna um dict de DataFrames (índice = x_cols, colunas = y_cols):
+    pearson_r, pearson_p, spearman_r, spearman_p e n (linhas usadas no par).
+    """
+    X = _numeric_matrix(df, x_cols)
+    Y = _numeric_matrix(df, y_cols)
+    shape = (len(x_cols), len(y_cols))
+    out = {k: np.full(shape, np.nan) for k in ("pearson_r", "spearman_r")}
+    n = np.zeros(shape, dtype="int64")
+
+    for mask, pairs in _mask_groups(~np.isnan(X), ~np.isnan(Y)):
+        xi = sorted({i for i, _ in pairs})
+        yj = sorted({j for _, j in pairs})
+        Xs, Ys = X[mask][:, xi], Y[mask][:, yj]
+        rows = int(mask.sum())
+        if rows < 2:
+            pearson = spearman = np.full((len(xi), len(yj)), np.nan)
+        else:
+            pearson = _pearson_block(Xs, Ys)
+            spearman = _pearson_block(rankdata(Xs, axis=0), rankdata(Ys, axis=0))
+        pos_x = {c: k for k, c in enumerate(xi)}
+        pos_y = {c: k for k, c in enumerate(yj)}
+        for i, j in pairs:
+            out["pearson_r"][i, j] = pearson[pos_x[i], pos_y[j]]
+            out["spearman_r"][i, j] = spearman[pos_x[i], pos_y[j]]
+            n[i, j] = rows
+
+    out["pearson_p"] = p_values(out["pearson_r"], n)
+    out["spearman_p"] = p_values(out["spearman_r"], n)
+    out["n"] = n
+    return {k: pd.DataFrame(v, index=list(x_cols), columns=list(y_cols)) for k, v in out.items()}
+
+
+def strength_label(r):
+    r = abs(r)
+    for limit, label in STRENGTH_LABELS:
+        if r < limit:
+            return label
+    return STRONGEST_LABEL
+
+
+def _significant_pairs(result, alpha=ALPHA):
+    for x in result["pearson_r"].index:
+        for y in result["pearson_r"].columns:
+            if result["pearson_p"].at[x, y] < alpha or result["spearman_p"].at[x, y] < alpha:
+                yield x, y
+
+
+def significant_correlations(result, names=None, alpha=ALPHA):
+    """Pares com p < alpha em Pearson ou Spearman, no formato do analysis_report.json.
+
+    `names` mapeia a coluna x para o prefixo do relacionamento
+    (ex.: {"age_years": "maturity_age_years"}).
+    """
+    names = names or {}
+    found = []
+    for x, y in _significant_pairs(result, alpha):
+        pr, pp = result["pearson_r"].at[x, y], result["pearson_p"].at[x, y]
+        sr, sp = result["spearman_r"].at[x, y], result["spearman_p"].at[x, y]
+        found.append({
+            "relationship": f"{names.get(x, x)}_{y}",
+            "pearson": [float(pr), float(pp)],
+            "spearman": [float(sr), float(sp)],
+            "strength": strength_label(np.nanmax([abs(pr), abs(sr)])),
+        })
+    return found
+
+
+def build_report(df, x_cols, y_cols, names=None, alpha=ALPHA, result=None, resamples=0, workers=None):
+    """Relatório no formato de analysis_report.json a partir de uma única passada.
+
+    Com resamples > 0, cada correlação significativa ganha ICs por bootstrap
+    (pearson_ci, spearman_ci) e um p-valor por permutação (permutation_p).
+    """
+    result = result if result is not None else correlation_matrix(df, x_cols, y_cols)
+    stats = df[list(y_cols)].apply(pd.to_numeric, errors="coerce").describe()
+    quality_stats = {c: {k: float(v) for k, v in stats[c].items()} for c in stats.columns}
+    report = assemble_report(result, quality_stats, len(df), names, alpha)
+    if resamples:
+        for entry, (x, y) in zip(report["significant_correlations"], _significant_pairs(result, alpha)):
+            entry.update(resample_summary(_numeric_matrix(df, [x])[:, 0], _numeric_matrix(df, [y])[:, 0],
+                                          resamples=resamples, workers=workers))
+    return report
+
+
+def assemble_report(result, quality_stats, sample_size, names=None, alpha=ALPHA):
+    """Monta o relatório a partir de matrizes já calculadas (também usado no modo em chunks)."""
+    return {
+        "sample_size": int(sample_size),
+        "quality_metrics": list(result["pearson_r"].columns),
+        "process_metrics": list(result["pearson_r"].index),
+        "quality_stats": quality_stats,
+        "significant_correlations": significant_correlations(result, names, alpha),
+    }
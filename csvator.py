@@ -1,70 +1,160 @@
 import os
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+
 import pandas as pd
 
+from streamstats import summarize_csv
+from ck_discovery import INDEX_NAME, discover_ck_outputs, save_index
+from agg_cache import MISSING, AggregateCache, file_digest
+from tabular_io import with_format, write_table
+
 # Pasta onde estão os CSVs individuais de cada repositório
 input_folder = "lab02_ck_results"
 output_file = "lab02_ck_aggregated.csv"
+CACHE_NAME = ".csvator_cache.json"
 
-# Lista todos os arquivos CSV
-csv_files = [os.path.join(input_folder, f) for f in os.listdir(input_folder) if f.endswith('.csv')]
-
-# Lista para armazenar os dados agregados
-aggregated_data = []
-
-# Função auxiliar para somar ou calcular média com segurança
-def safe_agg(df, col, agg_type='sum'):
-    if col in df.columns:
-        if agg_type == 'sum':
-            return df[col].sum()
-        elif agg_type == 'mean':
-            return df[col].mean()
-        elif agg_type == 'median':
-            return df[col].median()
-        elif agg_type == 'std':
-            return df[col].std()
-    else:
-        return 0
+# Colunas lidas de cada CSV (uma única passada por arquivo, em chunks do pandas)
+AGG_COLUMNS = ['cboModified', 'wmc', 'loc', 'fanout', 'fanin', 'loopQty', 'comparisonsQty',
+               'methodsInvokedQty', 'methodsInvokedLocalQty', 'methodsInvokedIndirectLocalQty', 'hasJavaDoc']
 
-# Itera sobre cada CSV
-for csv_file in csv_files:
+
+def aggregate_file(csv_file, repo_name=None, method_csv=None):
+    """Agrega um CSV do CK em uma linha; retorna None se vazio ou ilegível.
+
+    hasJavaDoc é métrica de método no CK: se o class.csv não a tiver, ela é
+    lida do method.csv do mesmo repositório.
+    """
     try:
-        df = pd.read_csv(csv_file, encoding='utf-8')
-        if df.empty:
+        n_rows, stats = summarize_csv(csv_file, AGG_COLUMNS)
+        if n_rows == 0:
             print(f"Ignorando CSV vazio: {csv_file}")
-            continue
-    except pd.errors.EmptyDataError:
-        print(f"Ignorando CSV vazio: {csv_file}")
-        continue
+            return None
+        javadoc_rows = n_rows
+        if 'hasJavaDoc' not in stats and method_csv:
+            javadoc_rows, method_stats = summarize_csv(method_csv, ['hasJavaDoc'])
+            stats.update(method_stats)
     except Exception as e:
         print(f"Erro ao ler {csv_file}: {e}")
-        continue
+        return None
+
+    if repo_name is None:
+        repo_name = os.path.basename(csv_file).replace(".csv", "")
 
-    repo_name = os.path.basename(csv_file).replace(".csv", "")
-    
-    aggregated_row = {
+    def col_mean(col):
+        return stats[col].mean if col in stats else 0
+
+    def col_sum(col):
+        if col not in stats:
+            return 0
+        total = stats[col].sum
+        return int(total) if total.is_integer() else total
+
+    return {
         'repo': repo_name,
-        'cbo_mean': df['cboModified'].mean() if 'cboModified' in df.columns else 0,
-        'cbo_sum': df['cboModified'].sum() if 'cboModified' in df.columns else 0,
-        'wmc_mean': df['wmc'].mean() if 'wmc' in df.columns else 0,
-        'wmc_sum': df['wmc'].sum() if 'wmc' in df.columns else 0,
-        'loc_sum': df['loc'].sum() if 'loc' in df.columns else 0,
-        'loc_mean': df['loc'].mean() if 'loc' in df.columns else 0,
-        'fanout_sum': df['fanout'].sum() if 'fanout' in df.columns else 0,
-        'fanin_sum': df['fanin'].sum() if 'fanin' in df.columns else 0,
-        'loopQty_sum': df['loopQty'].sum() if 'loopQty' in df.columns else 0,
-        'comparisonsQty_sum': df['comparisonsQty'].sum() if 'comparisonsQty' in df.columns else 0,
-        'methodsInvokedQty_sum': df['methodsInvokedQty'].sum() if 'methodsInvokedQty' in df.columns else 0,
-        'methodsInvokedLocalQty_sum': df['methodsInvokedLocalQty'].sum() if 'methodsInvokedLocalQty' in df.columns else 0,
-        'methodsInvokedIndirectLocalQty_sum': df['methodsInvokedIndirectLocalQty'].sum() if 'methodsInvokedIndirectLocalQty' in df.columns else 0,
-        'hasJavaDoc_ratio': df['hasJavaDoc'].sum() / len(df) if 'hasJavaDoc' in df.columns else 0
+        'cbo_mean': col_mean('cboModified'),
+        'cbo_sum': col_sum('cboModified'),
+        'wmc_mean': col_mean('wmc'),
+        'wmc_sum': col_sum('wmc'),
+        'loc_sum': col_sum('loc'),
+        'loc_mean': col_mean('loc'),
+        'fanout_sum': col_sum('fanout'),
+        'fanin_sum': col_sum('fanin'),
+        'loopQty_sum': col_sum('loopQty'),
+        'comparisonsQty_sum': col_sum('comparisonsQty'),
+        'methodsInvokedQty_sum': col_sum('methodsInvokedQty'),
+        'methodsInvokedLocalQty_sum': col_sum('methodsInvokedLocalQty'),
+        'methodsInvokedIndirectLocalQty_sum': col_sum('methodsInvokedIndirectLocalQty'),
+        'hasJavaDoc_ratio': col_sum('hasJavaDoc') / javadoc_rows if 'hasJavaDoc' in stats and javadoc_rows else 0
     }
-    
-    aggregated_data.append(aggregated_row)
 
 
-# Cria o DataFrame final
-df_aggregated = pd.DataFrame(aggregated_data)
+# hashes já no cache, visíveis aos workers (ver _init_worker)
+_known_digests = frozenset()
+
+
+def _init_worker(known_digests):
+    global _known_digests
+    _known_digests = known_digests
+
+
+def _aggregate_output(output):
+    """(hash, já no cache?, linha): o hash é calculado aqui, no worker, e não no processo pai."""
+    digest = file_digest(output.class_csv, output.method_csv)
+    if digest in _known_digests:
+        return digest, True, None
+    return digest, False, aggregate_file(output.class_csv, output.repo, output.method_csv)
+
+
+def aggregate(input_folder=input_folder, output_file=output_file, workers=1, cache_file=None, fmt=None):
+    """Agrega todos os CSVs de `input_folder` em `output_file`.
+
+    Os CSVs são descobertos recursivamente (ck_discovery); só arquivos novos ou
+    alterados são agregados, o resto vem do cache (agg_cache). Índice e cache
+    ficam ao lado de `output_file`, fora de `input_folder`, para não alterar o
+    mtime da raiz indexada. Com workers > 1 os arquivos são distribuídos num
+    pool de processos; as linhas saem na mesma ordem da lista de arquivos.
+    """
+    state_dir = os.path.dirname(os.path.abspath(output_file))
+    index_path = os.path.join(state_dir, INDEX_NAME)
+    outputs, index = discover_ck_outputs(input_folder, index_path)
+    cache = AggregateCache(cache_file or os.path.join(state_dir, CACHE_NAME))
+    cached = {}
+    pending = []
+    for o in outputs:
+        row = cache.lookup(o)
+        if row is MISSING:
+            pending.append(o)
+        else:
+            cached[o.repo] = row
+    print(f"{len(outputs)} saídas do CK encontradas, {len(pending)} novas ou alteradas ({cache.hits} do cache)")
+
+    known = cache.known_digests()
+    if workers > 1 and len(pending) > 1:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(known,)) as executor:
+            chunksize = max(1, len(pending) // (workers * 4))
+            fresh = list(executor.map(_aggregate_output, pending, chunksize=chunksize))
+    else:
+        _init_worker(known)
+        fresh = [_aggregate_output(o) for o in pending]
+    # primeiro os conteúdos já em cache (antes que store descarte entradas), depois os novos
+    for o, (digest, is_known, row) in zip(pending, fresh):
+        if is_known:
+            cache.remember(o, digest)
+            cached[o.repo] = cache.get(digest, o)
+    for o, (digest, is_known, row) in zip(pending, fresh):
+        if not is_known:
+            cache.store(o, digest, row)
+            cached[o.repo] = row
+
+    aggregated_data = [cached[o.repo] for o in outputs if cached[o.repo] is not None]
+
+    # Cria o DataFrame final
+    df_aggregated = pd.DataFrame(aggregated_data)
+
+    # Salva no formato pedido (ou pela extensão de output_file)
+    if fmt:
+        output_file = with_format(output_file, fmt)
+    write_table(df_aggregated, output_file)
+    print(f"Arquivo agregado criado: {output_file}")
+    save_index(index_path, index)
+    cache.save()
+    return df_aggregated
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Agrega os CSVs do CK por repositório.")
+    parser.add_argument("--input", default=input_folder, help="pasta com os CSVs do CK")
+    parser.add_argument("--output", default=output_file, help="CSV agregado de saída")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1,
+                        help="processos usados na agregação (1 = sequencial)")
+    parser.add_argument("--cache", default=None,
+                        help=f"arquivo do cache de agregação (padrão: {CACHE_NAME} ao lado de --output)")
+    parser.add_argument("--format", choices=["csv", "parquet", "feather"], default=None,
+                        help="formato de saída (padrão: pela extensão de --output)")
+    args = parser.parse_args()
+    aggregate(args.input, args.output, args.workers, args.cache, args.format)
+
 
-# Salva em CSV
-df_aggregated.to_csv(output_file, index=False)
-print(f"CSV agregado criado: {output_file}")
+if __name__ == "__main__":
+    main()
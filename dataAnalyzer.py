@@ -1,63 +1,255 @@
+"""
+dataAnalyzer.py
+
+Gera os gráficos de dispersão e o relatório de correlações das hipóteses
+IH01–IH04 a partir de uma especificação declarativa (hipoteses.json):
+métrica x de cada hipótese, métricas de qualidade y, transformações e
+escala dos eixos ("scale": "log" para métricas de cauda longa).
+
+O dataset é carregado uma única vez e todas as correlações saem de uma
+única passada (correlation.py). Cada saída (PNG ou relatório) guarda um
+carimbo com o hash da entrada e da sua especificação; saídas com carimbo
+atual são puladas (use --force para regerar tudo).
+
+Com --chunksize, o dataset é lido em chunks (outofcore.py): estatísticas,
+correlações e gráficos hexbin saem de agregados em memória limitada.
+
+Uso:
+    python dataAnalyzer.py --spec hipoteses.json --input resultadosFinais.csv --out graficos
+"""
+
+import argparse
+import hashlib
+import json
+import os
+
+import numpy as np
 import pandas as pd
-import seaborn as sns
-import matplotlib.pyplot as plt
-from scipy.stats import spearmanr
-from datetime import datetime, timezone
-
-# ------------------------------
-# 1. Carregar CSV
-# ------------------------------
-df = pd.read_csv(r"C:\DevGz\LabExp-02\resultadosFinais.csv")
-
-# ------------------------------
-# 2. Calcular idade em anos
-# ------------------------------
-df['createdAt'] = pd.to_datetime(df['createdAt'], utc=True)
-df['idade'] = (datetime.now(timezone.utc) - df['createdAt']).dt.days / 365
-
-# ------------------------------
-# 3. Configurações gerais dos gráficos
-# ------------------------------
-sns.set(style="whitegrid")
-plt.rcParams['figure.figsize'] = (8,6)
-
-def scatter_corr(x, y, xlabel, ylabel, title, filename):
-    corr, pval = spearmanr(x, y, nan_policy='omit')
-    sns.scatterplot(x=x, y=y)
-    plt.xlabel(xlabel)
-    plt.ylabel(ylabel)
-    plt.title(f"{title}\nSpearman: {corr:.2f} (p={pval:.3f})")
-    plt.tight_layout()
-    plt.savefig(filename)
-    plt.clf()
-    print(f"Gráfico salvo: {filename} | Spearman={corr:.2f} p={pval:.3f}")
-
-# ------------------------------
-# 4. IH01: Popularidade (stargazers) x Qualidade (CBO, DIT, LCOM)
-# ------------------------------
-scatter_corr(df['stargazers'], df['cbo_mean'], 'Estrelas', 'CBO médio', 'IH01 - Popularidade vs CBO', 'ih01_stars_cbo.png')
-scatter_corr(df['stargazers'], df['dit_mean'], 'Estrelas', 'DIT médio', 'IH01 - Popularidade vs DIT', 'ih01_stars_dit.png')
-scatter_corr(df['stargazers'], df['lcom_mean'], 'Estrelas', 'LCOM médio', 'IH01 - Popularidade vs LCOM', 'ih01_stars_lcom.png')
-
-# ------------------------------
-# 5. IH02: Maturidade (idade) x Qualidade
-# ------------------------------
-scatter_corr(df['idade'], df['cbo_mean'], 'Idade (anos)', 'CBO médio', 'IH02 - Maturidade vs CBO', 'ih02_idade_cbo.png')
-scatter_corr(df['idade'], df['dit_mean'], 'Idade (anos)', 'DIT médio', 'IH02 - Maturidade vs DIT', 'ih02_idade_dit.png')
-scatter_corr(df['idade'], df['lcom_mean'], 'Idade (anos)', 'LCOM médio', 'IH02 - Maturidade vs LCOM', 'ih02_idade_lcom.png')
-
-# ------------------------------
-# 6. IH03: Atividade (releases) x Qualidade
-# ------------------------------
-scatter_corr(df['releases'], df['cbo_mean'], 'Releases', 'CBO médio', 'IH03 - Atividade vs CBO', 'ih03_releases_cbo.png')
-scatter_corr(df['releases'], df['dit_mean'], 'Releases', 'DIT médio', 'IH03 - Atividade vs DIT', 'ih03_releases_dit.png')
-scatter_corr(df['releases'], df['lcom_mean'], 'Releases', 'LCOM médio', 'IH03 - Atividade vs LCOM', 'ih03_releases_lcom.png')
-
-# ------------------------------
-# 7. IH04: Tamanho (LOC total) x Qualidade
-# ------------------------------
-scatter_corr(df['loc_total'], df['cbo_mean'], 'LOC total', 'CBO médio', 'IH04 - Tamanho vs CBO', 'ih04_loc_cbo.png')
-scatter_corr(df['loc_total'], df['dit_mean'], 'LOC total', 'DIT médio', 'IH04 - Tamanho vs DIT', 'ih04_loc_dit.png')
-scatter_corr(df['loc_total'], df['lcom_mean'], 'LOC total', 'LCOM médio', 'IH04 - Tamanho vs LCOM', 'ih04_loc_lcom.png')
-
-print("Todos os gráficos foram gerados com sucesso!")
+
+from agg_cache import file_digest
+from tabular_io import read_table
+from derived_metrics import REFERENCE_ENV, add_process_metrics, reference_timestamp, table_reference
+from charts import DENSITY_THRESHOLD, render_charts
+from correlation import assemble_report, build_report, correlation_matrix
+from outofcore import analyze_files
+
+SPEC_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "hipoteses.json")
+OUTPUT_DIR = "graficos"
+REPORT_NAME = "analysis_report.json"
+STAMP_NAME = ".analysis_stamps.json"
+BOOTSTRAP_RESAMPLES = 0  # > 0 acrescenta ICs por bootstrap e p-valor de permutação ao relatório
+
+TRANSFORMS = {
+    "log1p": np.log1p,
+    "log10": lambda v: np.log10(np.where(v > 0, v, np.nan)),
+    "sqrt": np.sqrt,
+}
+SCALES = ("linear", "log")
+
+
+def load_spec(path):
+    with open(path, "r", encoding="utf-8") as f:
+        spec = json.load(f)
+    for key in ("quality_metrics", "hypotheses"):
+        if key not in spec:
+            raise ValueError(f"{path}: chave obrigatória ausente: {key}")
+    base = os.path.dirname(os.path.abspath(path))
+    if spec.get("input") and not os.path.isabs(spec["input"]):
+        spec["input"] = os.path.join(base, spec["input"])
+    for hyp in spec["hypotheses"]:
+        unknown = [y for y in hyp["y"] if y not in spec["quality_metrics"]]
+        if unknown:
+            raise ValueError(f"{path}: {hyp['id']} usa métricas não declaradas: {', '.join(unknown)}")
+        entries = [hyp] + [spec["quality_metrics"][y] for y in hyp["y"]]
+        for t in [e.get("transform") for e in entries]:
+            if t is not None and t not in TRANSFORMS:
+                raise ValueError(f"{path}: transformação desconhecida: {t} (use {', '.join(TRANSFORMS)})")
+        for scale in [e.get("scale", "linear") for e in entries]:
+            if scale not in SCALES:
+                raise ValueError(f"{path}: escala desconhecida: {scale} (use {', '.join(SCALES)})")
+    return spec
+
+
+def column_key(col, transform=None):
+    return f"{transform}({col})" if transform else col
+
+
+def chart_plan(spec, output_dir):
+    """Um registro por gráfico: colunas (já com transformação), rótulos e caminho."""
+    plan = []
+    for hyp in spec["hypotheses"]:
+        x_key = column_key(hyp["x"], hyp.get("transform"))
+        for y in hyp["y"]:
+            meta = spec["quality_metrics"][y]
+            plan.append({
+                "x": x_key, "y": column_key(y, meta.get("transform")),
+                "xlabel": hyp["x_label"], "ylabel": meta["label"],
+                "title": f"{hyp['id']} - {hyp['name']} vs {meta['short']}",
+                "path": os.path.join(output_dir, f"{hyp['id'].lower()}_{hyp['slug']}_{meta['slug']}.png"),
+                "xscale": hyp.get("scale", "linear"), "yscale": meta.get("scale", "linear"),
+                "density_threshold": spec.get("density_threshold", DENSITY_THRESHOLD),
+            })
+    return plan
+
+
+def prepare_columns(df, spec):
+    """DataFrame só com as colunas usadas, numéricas e transformadas."""
+    wanted = {}
+    for hyp in spec["hypotheses"]:
+        wanted[column_key(hyp["x"], hyp.get("transform"))] = (hyp["x"], hyp.get("transform"))
+        for y in hyp["y"]:
+            t = spec["quality_metrics"][y].get("transform")
+            wanted[column_key(y, t)] = (y, t)
+    data = {}
+    for key, (col, transform) in wanted.items():
+        values = pd.to_numeric(df[col], errors="coerce").to_numpy(dtype="float64", na_value=np.nan)
+        if transform:
+            with np.errstate(divide="ignore", invalid="ignore"):
+                values = TRANSFORMS[transform](values)
+        data[key] = values
+    return pd.DataFrame(data, index=df.index)
+
+
+def _stamp(input_digest, item):
+    # a referência das idades (override por ambiente) também muda as saídas
+    payload = json.dumps([input_digest, item, os.environ.get(REFERENCE_ENV)], sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+
+def load_stamps(path):
+    if not os.path.exists(path):
+        return {}
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_stamps(stamps, path):
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(stamps, f, indent=2, sort_keys=True)
+    os.replace(tmp, path)
+
+
+def _render(specs, plan, wanted, stamps, workers):
+    render_charts(specs, workers)
+    for s in specs:
+        print(f"Gráfico salvo: {s['path']} | Spearman={s['corr']:.2f} p={s['pval']:.3f}")
+        stamps[s["path"]] = wanted[s["path"]]
+    skipped = len(plan) - len(specs)
+    if skipped:
+        print(f"{skipped} gráficos já atualizados (pulados).")
+    return [s["path"] for s in specs]
+
+
+def _write_report(report, report_path, wanted, stamps):
+    with open(report_path, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+    stamps[report_path] = wanted[report_path]
+    print(f"Relatório salvo: {report_path} ({len(report['significant_correlations'])} correlações significativas)")
+    return report_path
+
+
+def _run_chunked(spec, input_path, plan, stale, wanted, stamps, stamp_path, report_path,
+                 x_cols, y_cols, names, workers, resamples, chunksize):
+    """Mesmas saídas de run(), a partir de agregados calculados em chunks."""
+    if resamples:
+        print("Aviso: bootstrap/permutação não disponível no modo em chunks; ignorando --resamples.")
+    scales = {c["x"]: c["xscale"] for c in plan}
+    scales.update({c["y"]: c["yscale"] for c in plan})
+    # uma única referência para as idades, do arquivo inteiro (não do updatedAt de cada chunk)
+    reference = reference_timestamp(table_reference(input_path, chunksize))
+    agg = analyze_files([input_path], x_cols, y_cols, chunksize, scales=scales,
+                        prepare=lambda chunk: prepare_columns(add_process_metrics(chunk, reference), spec))
+    result = agg["correlations"]
+    rho, pvals = result["spearman_r"], result["spearman_p"]
+    specs = [dict(c, x=[], y=[], hexbin=agg["hexbins"].get((c["x"], c["y"])),
+                  corr=float(rho.at[c["x"], c["y"]]), pval=float(pvals.at[c["x"], c["y"]]))
+             for c in plan if c["path"] in stale]
+    written = _render(specs, plan, wanted, stamps, workers)
+    if report_path in stale:
+        report = assemble_report(result, {y: agg["stats"][y] for y in y_cols}, agg["rows"], names)
+        written.append(_write_report(report, report_path, wanted, stamps))
+    save_stamps(stamps, stamp_path)
+    return written
+
+
+def run(spec, input_path=None, output_dir=None, workers=None, resamples=None, force=False, chunksize=None):
+    input_path = input_path or spec.get("input")
+    if not input_path:
+        raise ValueError("Informe o dataset (--input ou 'input' na especificação).")
+    output_dir = output_dir or spec.get("output_dir", OUTPUT_DIR)
+    resamples = resamples if resamples is not None else spec.get("bootstrap_resamples", BOOTSTRAP_RESAMPLES)
+    os.makedirs(output_dir, exist_ok=True)
+
+    # 1. Carimbos: hash do dataset + especificação de cada saída
+    input_digest = file_digest(input_path)
+    plan = chart_plan(spec, output_dir)
+    report_path = os.path.join(output_dir, spec.get("report", REPORT_NAME))
+    report_item = {"hypotheses": spec["hypotheses"], "quality_metrics": spec["quality_metrics"],
+                   "resamples": resamples}
+    stamp_path = os.path.join(output_dir, STAMP_NAME)
+    stamps = load_stamps(stamp_path)
+    if chunksize:
+        # o modo em chunks gera saídas diferentes (hexbin, Spearman aproximado)
+        report_item["out_of_core"] = True
+    wanted = {c["path"]: _stamp(input_digest, dict(c, out_of_core=True) if chunksize else c) for c in plan}
+    wanted[report_path] = _stamp(input_digest, report_item)
+    stale = {p for p, s in wanted.items() if force or stamps.get(p) != s or not os.path.exists(p)}
+    if not stale:
+        print("Nada a fazer: todas as saídas estão atualizadas.")
+        return []
+
+    x_cols = list(dict.fromkeys(c["x"] for c in plan))
+    y_cols = list(dict.fromkeys(c["y"] for c in plan))
+    names = {column_key(h["x"], h.get("transform")): h["relationship"] for h in spec["hypotheses"]}
+    if chunksize:
+        return _run_chunked(spec, input_path, plan, stale, wanted, stamps, stamp_path, report_path,
+                            x_cols, y_cols, names, workers, resamples, chunksize)
+
+    # 2. Carregar dados uma vez (CSV, Parquet ou Feather, pela extensão) + métricas derivadas
+    df = add_process_metrics(read_table(input_path))
+    data = prepare_columns(df, spec)
+
+    # 3. Todas as correlações x × y numa única passada (cada coluna ranqueada uma vez)
+    result = correlation_matrix(data, x_cols, y_cols)
+    rho, pvals = result["spearman_r"], result["spearman_p"]
+
+    # 4. Gráficos desatualizados, renderizados em paralelo
+    specs = [dict(c, x=data[c["x"]].to_numpy(), y=data[c["y"]].to_numpy(),
+                  corr=float(rho.at[c["x"], c["y"]]), pval=float(pvals.at[c["x"], c["y"]]))
+             for c in plan if c["path"] in stale]
+    written = _render(specs, plan, wanted, stamps, workers)
+
+    # 5. Relatório com as correlações significativas, da mesma matriz
+    if report_path in stale:
+        report = build_report(data, x_cols, y_cols, names, result=result,
+                              resamples=resamples, workers=workers)
+        written.append(_write_report(report, report_path, wanted, stamps))
+
+    save_stamps(stamps, stamp_path)
+    return written
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Gera gráficos e relatório de correlações das hipóteses.")
+    parser.add_argument("--spec", default=SPEC_PATH, help="especificação das hipóteses (JSON)")
+    parser.add_argument("--input", default=None, help="dataset (padrão: 'input' da especificação)")
+    parser.add_argument("--out", default=None, help=f"pasta de saída (padrão: 'output_dir' ou {OUTPUT_DIR})")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1,
+                        help="processos usados nos gráficos e reamostragens (1 = sequencial)")
+    parser.add_argument("--resamples", type=int, default=None,
+                        help="reamostras de bootstrap/permutação (0 = desligado)")
+    parser.add_argument("--force", action="store_true", help="regera todas as saídas")
+    parser.add_argument("--chunksize", type=int, default=None,
+                        help="lê o dataset em chunks deste tamanho (memória limitada, gráficos hexbin)")
+    args = parser.parse_args()
+    if run(load_spec(args.spec), args.input, args.out, args.workers, args.resamples, args.force,
+           args.chunksize):
+        print("Todos os gráficos foram gerados com sucesso!")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+"""
+derived_metrics.py
+
+Métricas de processo derivadas, calculadas sobre colunas inteiras (NumPy).
+
+Todas as idades usam o mesmo instante de referência: o momento da coleta,
+registrado uma vez quando a busca roda (coluna collected_at da lista de
+repositórios), para que coleta e análise produzam os mesmos números em
+qualquer dia em que forem executadas. Datasets sem collected_at usam o
+updatedAt mais recente como aproximação da coleta. A variável de ambiente
+LAB02_REFERENCE_DATE, se definida, sobrepõe a referência.
+
+Quem processa um dataset em chunks deve calcular a referência uma vez, sobre
+o arquivo inteiro (table_reference), e passá-la a cada chunk; senão cada
+chunk usaria o seu próprio updatedAt máximo.
+"""
+
+import os
+
+import numpy as np
+import pandas as pd
+
+from tabular_io import iter_table, table_columns
+
+REFERENCE_ENV = "LAB02_REFERENCE_DATE"
+SECONDS_PER_YEAR = 365 * 24 * 3600
+
+
+def collection_timestamp():
+    """Instante atual em UTC (ao segundo), para registrar o momento da coleta."""
+    return pd.Timestamp.now(tz="UTC").floor("s")
+
+
+def reference_timestamp(reference=None):
+    """LAB02_REFERENCE_DATE (override), senão `reference`, senão o instante atual."""
+    value = os.environ.get(REFERENCE_ENV) or reference
+    if value is None or (not isinstance(value, str) and pd.isna(value)):
+        return collection_timestamp()
+    ts = pd.Timestamp(value)
+    return ts.tz_localize("UTC") if ts.tzinfo is None else ts.tz_convert("UTC")
+
+
+def dataset_reference(df, collected_col="collected_at", updated_col="updatedAt"):
+    """Momento da coleta de um dataset: collected_at, ou o updatedAt mais recente."""
+    for col in (collected_col, updated_col):
+        if col in df.columns:
+            ts = pd.to_datetime(df[col], utc=True, errors="coerce", format="ISO8601").max()
+            if not pd.isna(ts):
+                return ts
+    return None
+
+
+def table_reference(path, chunksize=100_000, collected_col="collected_at", updated_col="updatedAt"):
+    """dataset_reference do arquivo inteiro, lendo só as colunas de data em chunks."""
+    cols = [c for c in (collected_col, updated_col) if c in table_columns(path)]
+    if not cols:
+        return None
+    latest = {}
+    for chunk in iter_table(path, columns=cols, chunksize=chunksize):
+        ref = {c: pd.to_datetime(chunk[c], utc=True, errors="coerce", format="ISO8601").max() for c in cols}
+        for c, ts in ref.items():
+            if not pd.isna(ts) and (c not in latest or ts > latest[c]):
+                latest[c] = ts
+    return latest.get(collected_col, latest.get(updated_col))
+
+
+def _seconds_before(timestamps, reference):
+    """Segundos entre cada timestamp e a referência (NaN para datas inválidas)."""
+    ts = pd.to_datetime(pd.Series(timestamps), utc=True, errors="coerce", format="ISO8601")
+    seconds = (reference - ts).dt.total_seconds()
+    return seconds.to_numpy(dtype="float64", na_value=np.nan)
+
+
+def age_years(created, reference=None):
+    """Idade em anos (365 dias) de cada data de criação, como array float64."""
+    return _seconds_before(created, reference_timestamp(reference)) / SECONDS_PER_YEAR
+
+
+def add_process_metrics(df, reference=None, created_col="createdAt", updated_col="updatedAt",
+                        releases_col="releases", age_col="idade"):
+    """Acrescenta idade, releases por ano e dias desde a última atualização.
+
+    Cada métrica só é calculada se as colunas de que depende existem; um
+    dataset sem datas (ex.: class.csv do CK) passa sem alterações. Sem
+    `reference`, usa o momento da coleta do próprio dataset (dataset_reference).
+    """
+    if created_col not in df.columns and updated_col not in df.columns:
+        return df
+    ref = reference_timestamp(reference if reference is not None else dataset_reference(df, updated_col=updated_col))
+    if created_col in df.columns:
+        age = _seconds_before(df[created_col], ref) / SECONDS_PER_YEAR
+        df[age_col] = age
+        if releases_col in df.columns:
+            releases = pd.to_numeric(df[releases_col], errors="coerce").to_numpy(dtype="float64", na_value=np.nan)
+            with np.errstate(divide="ignore", invalid="ignore"):
+                df["releases_per_year"] = np.where(age > 0, releases / age, np.nan)
+    if updated_col in df.columns:
+        df["days_since_update"] = _seconds_before(df[updated_col], ref) / 86400
+    return df
@@ -0,0 +1,90 @@
+"""
+incremental_csv.py
+
+Gravação incremental de um CSV consolidado enquanto a coleta ainda roda.
+
+As linhas são acumuladas em lotes e anexadas a `<arquivo>.part`. A cada lote
+o `.part` é copiado para um temporário e publicado com os.replace, de modo que
+quem lê `<arquivo>` (ex.: dataAnalyzer.py) sempre vê um CSV completo, com
+todas as linhas gravadas até o último lote.
+
+Um lote é gravado ao juntar `flush_every` linhas ou, via flush_if_due (chamado
+periodicamente por quem escreve, ex.: o monitor do pipeline), quando há linhas
+esperando há mais de `flush_interval` segundos. Cada publicação copia o
+arquivo inteiro, então o custo total cresce com o quadrado do número de lotes;
+com as ~1000 linhas curtas da coleta isso são poucos MB no total. Para
+arquivos muito maiores, aumente `flush_every`.
+"""
+
+import csv
+import math
+import os
+import shutil
+import threading
+import time
+from pathlib import Path
+
+
+def _cell(value):
+    if value is None or (isinstance(value, float) and math.isnan(value)):
+        return ""
+    return value
+
+
+class IncrementalCSVWriter:
+    def __init__(self, path, columns, flush_every=25, flush_interval=30.0):
+        self.path = Path(path)
+        self.part_path = self.path.with_name(self.path.name + ".part")
+        self.columns = list(columns)
+        self.flush_every = flush_every
+        self.flush_interval = flush_interval
+        self.buffer = []
+        self.rows_written = 0
+        self.last_flush = time.monotonic()
+        self.closed = False
+        self.lock = threading.Lock()
+        # cada execução recomeça o .part (linhas retomadas são reenviadas via add)
+        with open(self.part_path, "w", newline="", encoding="utf-8") as fh:
+            csv.writer(fh).writerow(self.columns)
+
+    def add(self, row):
+        with self.lock:
+            self.buffer.append(row)
+            due = time.monotonic() - self.last_flush >= self.flush_interval
+            if len(self.buffer) >= self.flush_every or due:
+                self._flush()
+
+    def flush_if_due(self):
+        """Publica as linhas pendentes se o lote está esperando há flush_interval segundos."""
+        with self.lock:
+            if self.closed or not self.buffer:
+                return
+            if time.monotonic() - self.last_flush >= self.flush_interval:
+                self._flush()
+
+    def flush(self):
+        with self.lock:
+            self._flush()
+
+    def _flush(self, publish=True):
+        if self.buffer:
+            with open(self.part_path, "a", newline="", encoding="utf-8") as fh:
+                writer = csv.DictWriter(fh, fieldnames=self.columns, extrasaction="ignore")
+                for row in self.buffer:
+                    writer.writerow({k: _cell(row.get(k)) for k in self.columns})
+                fh.flush()
+                os.fsync(fh.fileno())
+            self.rows_written += len(self.buffer)
+            self.buffer = []
+        if publish:
+            tmp = self.path.with_name(self.path.name + ".tmp")
+            shutil.copyfile(self.part_path, tmp)
+            os.replace(tmp, self.path)
+        self.last_flush = time.monotonic()
+
+    def close(self):
+        with self.lock:
+            self._flush(publish=False)
+            os.replace(self.part_path, self.path)
+            self.closed = True
+        return self.rows_written
@@ -0,0 +1,37 @@
+import com.github.mauricioaniche.ck.Runner;
+
+import java.io.BufferedReader;
+import java.io.InputStreamReader;
+import java.io.PrintStream;
+import java.nio.charset.StandardCharsets;
+
+/**
+ * Servidor CK de longa duração (uma JVM aquecida por worker).
+ *
+ * Lê um pedido por linha no stdin, com os argumentos do Runner do CK
+ * separados por TAB, e responde com uma linha "CKSERVER OK" ou
+ * "CKSERVER ERR <mensagem>" no stdout. Termina quando o stdin fecha.
+ *
+ * Uso (Java 11+): java -cp ck-*-jar-with-dependencies.jar CKServer.java
+ */
+public class CKServer {
+    public static void main(String[] args) throws Exception {
+        BufferedReader in = new BufferedReader(new InputStreamReader(System.in, StandardCharsets.UTF_8));
+        PrintStream protocol = new PrintStream(System.out, true, "UTF-8");
+        // logs do CK vão para o stderr para não se misturarem com o protocolo
+        System.setOut(System.err);
+
+        String line;
+        while ((line = in.readLine()) != null) {
+            if (line.isEmpty()) {
+                continue;
+            }
+            try {
+                Runner.main(line.split("\t"));
+                protocol.println("CKSERVER OK");
+            } catch (Throwable t) {
+                protocol.println("CKSERVER ERR " + String.valueOf(t).replace('\n', ' '));
+            }
+        }
+    }
+}
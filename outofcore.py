@@ -0,0 +1,348 @@
+"""
+outofcore.py
+
+Análise em memória limitada para conjuntos que não cabem num DataFrame
+(ex.: milhões de linhas de class.csv do CK).
+
+Os arquivos são lidos em chunks (tabular_io.iter_table) em três passadas:
+
+ 1. RunningStats por coluna: contagem, média, desvio, mínimo e máximo;
+ 2. histograma fino por coluna, em escala asinh entre mínimo e máximo
+    (monótona, comprime caudas longas) -> quantis aproximados e a divisão
+    da coluna em RANK_BINS bins de quantil;
+ 3. por par (x, y): tabela de contingência entre os bins de quantil
+    (Spearman aproximado pelos postos médios de cada bin), somas para o
+    Pearson exato e contagens hexagonais para os gráficos.
+
+A memória depende só do número de bins, nunca do número de linhas. O
+Spearman é exato quando cada bin contém um único valor distinto; nos demais
+casos os valores de um mesmo bin contam como empatados.
+
+Uso:
+    python outofcore.py --input saida_ck/*/class.csv --x loc --y cbo dit lcom
+"""
+
+import argparse
+import json
+import math
+import os
+
+import numpy as np
+import pandas as pd
+
+from correlation import p_values
+from streamstats import RunningStats
+from tabular_io import iter_table
+
+CHUNKSIZE = 200_000
+FINE_BINS = 8192
+RANK_BINS = 256
+HEX_GRIDSIZE = 50
+DESCRIBE_QUANTILES = (0.25, 0.5, 0.75)
+
+
+def _values(chunk, col):
+    return pd.to_numeric(chunk[col], errors="coerce").to_numpy(dtype="float64", na_value=np.nan)
+
+
+class FineHistogram:
+    """Histograma de `bins` bins iguais em asinh(v), entre o mínimo e o máximo da coluna."""
+
+    def __init__(self, vmin, vmax, bins=FINE_BINS):
+        self.vmin, self.vmax = vmin, vmax
+        self.lo, self.hi = math.asinh(vmin), math.asinh(vmax)
+        self.bins = bins
+        self.counts = np.zeros(bins, dtype="int64")
+
+    def index(self, values):
+        if self.hi <= self.lo:
+            return np.zeros(len(values), dtype="int64")
+        pos = (np.arcsinh(values) - self.lo) / (self.hi - self.lo) * self.bins
+        return np.clip(pos.astype("int64"), 0, self.bins - 1)
+
+    def add(self, values):
+        self.counts += np.bincount(self.index(values), minlength=self.bins)
+
+    def quantile(self, q):
+        total = self.counts.sum()
+        if total == 0:
+            return math.nan
+        cum = np.cumsum(self.counts)
+        target = q * total
+        k = min(int(np.searchsorted(cum, target, side="left")), self.bins - 1)
+        before = cum[k] - self.counts[k]
+        within = (target - before) / self.counts[k] if self.counts[k] else 0.0
+        a = self.lo + (k + within) / self.bins * (self.hi - self.lo)
+        return float(min(max(math.sinh(a), self.vmin), self.vmax))
+
+    def rank_bins(self, bins=RANK_BINS):
+        """Mapa bin fino -> bin de quantil (posição do bin fino na distribuição acumulada)."""
+        total = max(int(self.counts.sum()), 1)
+        before = np.cumsum(self.counts) - self.counts
+        return np.minimum(before * bins // total, bins - 1)
+
+
+class HexBins:
+    """Contagens numa grade hexagonal com a mesma geometria do Axes.hexbin do Matplotlib.
+
+    Com xscale/yscale="log" a grade é montada em log10 (como o hexbin do
+    Matplotlib); valores <= 0 ficam de fora nesses eixos.
+    """
+
+    def __init__(self, extent, gridsize=HEX_GRIDSIZE, xscale="linear", yscale="linear"):
+        self.xscale, self.yscale = xscale, yscale
+        xmin, xmax, ymin, ymax = extent
+        if xscale == "log":
+            xmin, xmax = math.log10(xmin), math.log10(xmax)
+        if yscale == "log":
+            ymin, ymax = math.log10(ymin), math.log10(ymax)
+        if xmax <= xmin:
+            xmin, xmax = xmin - 0.5, xmax + 0.5
+        if ymax <= ymin:
+            ymin, ymax = ymin - 0.5, ymax + 0.5
+        self.nx = gridsize
+        self.ny = max(int(gridsize / math.sqrt(3)), 1)
+        self.extent = (xmin, xmax, ymin, ymax)
+        padding = 1e-9 * (xmax - xmin)
+        self._xmin, self._xmax = xmin - padding, xmax + padding
+        self._sx = (self._xmax - self._xmin) / self.nx
+        self._sy = (ymax - ymin) / self.ny
+        self.counts1 = np.zeros((self.nx + 1) * (self.ny + 1), dtype="int64")
+        self.counts2 = np.zeros(self.nx * self.ny, dtype="int64")
+
+    def add(self, x, y):
+        if self.xscale == "log" or self.yscale == "log":
+            keep = np.ones(len(x), dtype=bool)
+            if self.xscale == "log":
+                keep &= x > 0
+            if self.yscale == "log":
+                keep &= y > 0
+            x, y = x[keep], y[keep]
+            x = np.log10(x) if self.xscale == "log" else x
+            y = np.log10(y) if self.yscale == "log" else y
+        ix = (x - self._xmin) / self._sx
+        iy = (y - self.extent[2]) / self._sy
+        ix1, iy1 = np.round(ix).astype("int64"), np.round(iy).astype("int64")
+        ix2, iy2 = np.floor(ix).astype("int64"), np.floor(iy).astype("int64")
+        nx1, ny1, nx2, ny2 = self.nx + 1, self.ny + 1, self.nx, self.ny
+        i1 = np.where((0 <= ix1) & (ix1 < nx1) & (0 <= iy1) & (iy1 < ny1), ix1 * ny1 + iy1 + 1, 0)
+        i2 = np.where((0 <= ix2) & (ix2 < nx2) & (0 <= iy2) & (iy2 < ny2), ix2 * ny2 + iy2 + 1, 0)
+        d1 = (ix - ix1) ** 2 + 3.0 * (iy - iy1) ** 2
+        d2 = (ix - ix2 - 0.5) ** 2 + 3.0 * (iy - iy2 - 0.5) ** 2
+        near1 = d1 < d2
+        self.counts1 += np.bincount(i1[near1], minlength=1 + nx1 * ny1)[1:]
+        self.counts2 += np.bincount(i2[~near1], minlength=1 + nx2 * ny2)[1:]
+
+    def centers(self):
+        nx1, ny1, nx2, ny2 = self.nx + 1, self.ny + 1, self.nx, self.ny
+        cx = np.concatenate([np.repeat(np.arange(nx1), ny1), np.repeat(np.arange(nx2) + 0.5, ny2)])
+        cy = np.concatenate([np.tile(np.arange(ny1), nx1), np.tile(np.arange(ny2), nx2) + 0.5])
+        return cx * self._sx + self._xmin, cy * self._sy + self.extent[2]
+
+    def to_spec(self):
+        """Só as células ocupadas: centros (em unidades dos dados), contagens,
+        gridsize, extent (em log10 nos eixos log) e escalas, para charts.py."""
+        cx, cy = self.centers()
+        if self.xscale == "log":
+            cx = 10 ** cx
+        if self.yscale == "log":
+            cy = 10 ** cy
+        counts = np.concatenate([self.counts1, self.counts2])
+        filled = counts > 0
+        return {"x": cx[filled], "y": cy[filled], "counts": counts[filled],
+                "gridsize": (self.nx, self.ny), "extent": self.extent,
+                "xscale": self.xscale, "yscale": self.yscale}
+
+
+def data_extent(values, scale):
+    """Limites (mínimo, máximo) de `values` para a escala; em log, só os positivos."""
+    values = values[~np.isnan(values)]
+    if scale == "log":
+        values = values[values > 0]
+    if values.size == 0:
+        return (1.0, 10.0) if scale == "log" else (0.0, 1.0)
+    return float(values.min()), float(values.max())
+
+
+def aggregate_hexbin(x, y, gridsize=HEX_GRIDSIZE, xscale="linear", yscale="linear"):
+    """Hexbin pré-agregado de pontos em memória (uma passada vetorizada)."""
+    x = np.asarray(x, dtype="float64")
+    y = np.asarray(y, dtype="float64")
+    valid = ~(np.isnan(x) | np.isnan(y))
+    x, y = x[valid], y[valid]
+    hexbins = HexBins(data_extent(x, xscale) + data_extent(y, yscale), gridsize, xscale, yscale)
+    hexbins.add(x, y)
+    return hexbins.to_spec()
+
+
+class PairAccumulator:
+    def __init__(self, x_hist, y_hist, x_mean, y_mean, rank_bins=RANK_BINS, gridsize=HEX_GRIDSIZE,
+                 x_extent=None, y_extent=None, xscale="linear", yscale="linear"):
+        self.x_hist, self.y_hist = x_hist, y_hist
+        self.x_map, self.y_map = x_hist.rank_bins(rank_bins), y_hist.rank_bins(rank_bins)
+        self.kx, self.ky = int(self.x_map.max()) + 1, int(self.y_map.max()) + 1
+        self.table = np.zeros(self.kx * self.ky, dtype="int64")
+        self.x_mean, self.y_mean = x_mean, y_mean
+        self.n = 0
+        self.sx = self.sy = self.sxx = self.syy = self.sxy = 0.0
+        x_extent = x_extent or (x_hist.vmin, x_hist.vmax)
+        y_extent = y_extent or (y_hist.vmin, y_hist.vmax)
+        self.hex = HexBins(x_extent + y_extent, gridsize, xscale, yscale)
+
+    def add(self, x, y):
+        valid = ~(np.isnan(x) | np.isnan(y))
+        x, y = x[valid], y[valid]
+        if x.size == 0:
+            return
+        bx = self.x_map[self.x_hist.index(x)]
+        by = self.y_map[self.y_hist.index(y)]
+        self.table += np.bincount(bx * self.ky + by, minlength=self.kx * self.ky)
+        dx, dy = x - self.x_mean, y - self.y_mean
+        self.n += int(x.size)
+        self.sx += float(dx.sum())
+        self.sy += float(dy.sum())
+        self.sxx += float((dx * dx).sum())
+        self.syy += float((dy * dy).sum())
+        self.sxy += float((dx * dy).sum())
+        self.hex.add(x, y)
+
+    def pearson(self):
+        if self.n < 2:
+            return math.nan
+        cov = self.sxy - self.sx * self.sy / self.n
+        den = math.sqrt(max(self.sxx - self.sx ** 2 / self.n, 0.0) * max(self.syy - self.sy ** 2 / self.n, 0.0))
+        return max(-1.0, min(1.0, cov / den)) if den > 0 else math.nan
+
+    def spearman(self):
+        """Pearson dos postos médios de cada bin, ponderado pela tabela de contingência."""
+        if self.n < 2:
+            return math.nan
+        table = self.table.reshape(self.kx, self.ky).astype("float64")
+        a, b = table.sum(axis=1), table.sum(axis=0)
+        rx = np.cumsum(a) - a + (a + 1) / 2
+        ry = np.cumsum(b) - b + (b + 1) / 2
+        dx = rx - (a * rx).sum() / self.n
+        dy = ry - (b * ry).sum() / self.n
+        den = math.sqrt((a * dx * dx).sum() * (b * dy * dy).sum())
+        return max(-1.0, min(1.0, float(dx @ table @ dy) / den)) if den > 0 else math.nan
+
+
+def analyze_chunks(chunks, x_cols, y_cols, rank_bins=RANK_BINS, gridsize=HEX_GRIDSIZE,
+                   quantiles=DESCRIBE_QUANTILES, scales=None):
+    """Estatísticas, correlações e hexbins de x_cols × y_cols em três passadas.
+
+    `chunks` é uma função sem argumentos que devolve um iterador novo de
+    DataFrames a cada chamada. Retorna um dict com rows, stats (no formato
+    do DataFrame.describe), correlations (mesmo formato de
+    correlation.correlation_matrix) e hexbins {(x, y): spec}. `scales`
+    ({coluna: "log"}) define os eixos log dos hexbins.
+    """
+    columns = list(dict.fromkeys(list(x_cols) + list(y_cols)))
+    scales = scales or {}
+    positive_min = {c: math.inf for c in columns if scales.get(c) == "log"}
+
+    # 1. contagem, média, desvio, mínimo e máximo
+    running = {c: RunningStats() for c in columns}
+    rows = 0
+    for chunk in chunks():
+        rows += len(chunk)
+        for c in columns:
+            values = _values(chunk, c)
+            running[c].add_array(values)
+            if c in positive_min and (values > 0).any():
+                positive_min[c] = min(positive_min[c], float(values[values > 0].min()))
+
+    # 2. histogramas finos -> quantis e bins de rank
+    hists = {c: FineHistogram(running[c].min, running[c].max) for c in columns if running[c].count}
+    for chunk in chunks():
+        for c, hist in hists.items():
+            values = _values(chunk, c)
+            hist.add(values[~np.isnan(values)])
+
+    # 3. contingência, somas de Pearson e hexbins por par
+    def extent(c):
+        if c not in positive_min:
+            return None
+        low = positive_min[c] if positive_min[c] < math.inf else 1.0
+        return low, max(running[c].max, low)
+
+    pairs = {(x, y): PairAccumulator(hists[x], hists[y], running[x].mean, running[y].mean, rank_bins, gridsize,
+                                     extent(x), extent(y), scales.get(x, "linear"), scales.get(y, "linear"))
+             for x in x_cols for y in y_cols if x in hists and y in hists}
+    for chunk in chunks():
+        cache = {c: _values(chunk, c) for c in hists}
+        for (x, y), acc in pairs.items():
+            acc.add(cache[x], cache[y])
+
+    stats = {}
+    for c in columns:
+        acc = running[c]
+        entry = {"count": float(acc.count), "mean": acc.mean, "std": acc.std() if acc.count > 1 else math.nan,
+                 "min": acc.min}
+        for q in quantiles:
+            entry[f"{q * 100:g}%"] = hists[c].quantile(q) if c in hists else math.nan
+        entry["max"] = acc.max
+        stats[c] = entry
+
+    shape = (len(x_cols), len(y_cols))
+    out = {k: np.full(shape, np.nan) for k in ("pearson_r", "spearman_r")}
+    n = np.zeros(shape, dtype="int64")
+    for i, x in enumerate(x_cols):
+        for j, y in enumerate(y_cols):
+            acc = pairs.get((x, y))
+            if acc is not None:
+                out["pearson_r"][i, j], out["spearman_r"][i, j], n[i, j] = acc.pearson(), acc.spearman(), acc.n
+    out["pearson_p"] = p_values(out["pearson_r"], n)
+    out["spearman_p"] = p_values(out["spearman_r"], n)
+    out["n"] = n
+    correlations = {k: pd.DataFrame(v, index=list(x_cols), columns=list(y_cols)) for k, v in out.items()}
+    return {"rows": rows, "stats": stats, "correlations": correlations,
+            "hexbins": {key: acc.hex.to_spec() for key, acc in pairs.items()}}
+
+
+def analyze_files(paths, x_cols, y_cols, chunksize=CHUNKSIZE, prepare=None, **kwargs):
+    """analyze_chunks sobre um ou mais arquivos (CSV/Parquet/Feather); `prepare` transforma cada chunk."""
+    if isinstance(paths, (str, os.PathLike)):
+        paths = [paths]
+
+    def chunks():
+        for path in paths:
+            for chunk in iter_table(path, chunksize=chunksize):
+                yield prepare(chunk) if prepare else chunk
+
+    return analyze_chunks(chunks, x_cols, y_cols, **kwargs)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Estatísticas e correlações em chunks (memória limitada).")
+    parser.add_argument("--input", nargs="+", required=True, help="arquivos CSV/Parquet/Feather")
+    parser.add_argument("--x", nargs="+", required=True, help="colunas x (processo/tamanho)")
+    parser.add_argument("--y", nargs="+", required=True, help="colunas y (qualidade)")
+    parser.add_argument("--chunksize", type=int, default=CHUNKSIZE, help="linhas por chunk")
+    parser.add_argument("--rank-bins", type=int, default=RANK_BINS, help="bins de quantil do Spearman aproximado")
+    parser.add_argument("--output", default=None, help="JSON de saída (padrão: imprime na tela)")
+    args = parser.parse_args()
+
+    result = analyze_files(args.input, args.x, args.y, args.chunksize, rank_bins=args.rank_bins)
+    corr = result["correlations"]
+    payload = {
+        "rows": result["rows"],
+        "stats": result["stats"],
+        "correlations": [
+            {"x": x, "y": y, "n": int(corr["n"].at[x, y]),
+             "pearson": [float(corr["pearson_r"].at[x, y]), float(corr["pearson_p"].at[x, y])],
+             "spearman": [float(corr["spearman_r"].at[x, y]), float(corr["spearman_p"].at[x, y])]}
+            for x in args.x for y in args.y
+        ],
+    }
+    text = json.dumps(payload, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text)
+        print(f"Resultado salvo em {args.output} ({result['rows']} linhas)")
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
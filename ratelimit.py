@@ -0,0 +1,141 @@
+"""
+ratelimit.py
+
+Agendador de requisições para a API do GitHub (token bucket por recurso).
+
+ - Cada recurso ("graphql", "core", "archive") tem seu próprio balde de tokens
+ - O ritmo é recalculado a partir do `remaining`/`resetAt` devolvido pela API
+   (bloco rateLimit do GraphQL e cabeçalhos x-ratelimit-*)
+ - Limites secundários (403/429 com retry-after) pausam todas as threads do recurso
+ - Backoff exponencial com jitter substitui o sleep fixo
+"""
+
+import random
+import threading
+import time
+from datetime import datetime
+
+# recurso -> (ritmo inicial em tokens/s, ritmo máximo em tokens/s, capacidade do balde)
+# Ritmo inicial = 5000/h (limite primário); máximo = limites secundários por minuto.
+DEFAULT_LIMITS = {
+    "graphql": (5000 / 3600, 2000 / 60, 10),
+    "core": (5000 / 3600, 900 / 60, 10),
+    "archive": (5.0, 10.0, 10),
+}
+RESERVE = 50          # pontos deixados de reserva até o reset
+BACKOFF_BASE = 2.0    # segundos
+BACKOFF_CAP = 120.0   # segundos
+
+
+class TokenBucket:
+    def __init__(self, rate, max_rate, capacity):
+        self.rate = rate
+        self.max_rate = max_rate
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def try_take(self, cost):
+        """Retorna 0 se conseguiu consumir `cost` tokens, senão quantos segundos esperar."""
+        now = time.monotonic()
+        self._refill(now)
+        if now < self.blocked_until:
+            return self.blocked_until - now
+        if self.tokens >= cost:
+            self.tokens -= cost
+            return 0.0
+        if self.rate <= 0:
+            return 1.0
+        return (cost - self.tokens) / self.rate
+
+
+class RateScheduler:
+    """Token buckets compartilhados por todas as chamadas ao GitHub de um processo."""
+
+    def __init__(self, limits=None, share=1.0):
+        self.limits = dict(DEFAULT_LIMITS if limits is None else limits)
+        self.share = share
+        self.buckets = {}
+        self.costs = {}
+        self.lock = threading.Lock()
+
+    def _bucket(self, resource):
+        bucket = self.buckets.get(resource)
+        if bucket is None:
+            rate, max_rate, capacity = self.limits.get(resource, self.limits["core"])
+            bucket = TokenBucket(rate * self.share, max_rate * self.share, capacity)
+            self.buckets[resource] = bucket
+        return bucket
+
+    def acquire(self, resource, cost=None):
+        """Bloqueia até haver orçamento para uma requisição em `resource`."""
+        while True:
+            with self.lock:
+                bucket = self._bucket(resource)
+                if cost is None:
+                    cost = min(self.costs.get(resource, 1), bucket.capacity)
+                wait = bucket.try_take(cost)
+            if wait <= 0:
+                return
+            time.sleep(wait)
+
+    def update_budget(self, resource, remaining, reset_epoch, cost=None):
+        """Ajusta o ritmo para gastar `remaining` de forma uniforme até `reset_epoch`."""
+        with self.lock:
+            bucket = self._bucket(resource)
+            if cost:
+                self.costs[resource] = cost
+            seconds = max(reset_epoch - time.time(), 1.0)
+            usable = max(remaining - RESERVE * self.share, 0)
+            if usable <= 0:
+                # orçamento esgotado: pausa o recurso até o reset
+                bucket.blocked_until = max(bucket.blocked_until, time.monotonic() + seconds)
+                return
+            bucket.rate = min(usable * self.share / seconds, bucket.max_rate)
+
+    def update_from_graphql(self, rate_limit):
+        """Usa o bloco `rateLimit { remaining cost resetAt }` da resposta GraphQL."""
+        try:
+            reset = datetime.fromisoformat(rate_limit["resetAt"].replace("Z", "+00:00")).timestamp()
+            self.update_budget("graphql", int(rate_limit["remaining"]), reset, rate_limit.get("cost"))
+        except (KeyError, TypeError, ValueError, AttributeError):
+            pass
+
+    def update_from_headers(self, headers, resource="core"):
+        """Lê x-ratelimit-* e retry-after (limites primário e secundário)."""
+        resource = headers.get("x-ratelimit-resource", resource)
+        retry_after = headers.get("retry-after")
+        if retry_after:
+            try:
+                self.block(resource, float(retry_after))
+            except ValueError:
+                pass
+        remaining = headers.get("x-ratelimit-remaining")
+        reset = headers.get("x-ratelimit-reset")
+        if remaining is not None and reset is not None:
+            try:
+                self.update_budget(resource, int(remaining), float(reset))
+            except ValueError:
+                pass
+
+    def block(self, resource, seconds):
+        """Pausa todas as requisições de `resource` por `seconds` segundos."""
+        with self.lock:
+            bucket = self._bucket(resource)
+            bucket.blocked_until = max(bucket.blocked_until, time.monotonic() + seconds)
+
+    def penalize(self, resource, attempt):
+        """Aplica backoff exponencial com jitter após uma falha."""
+        delay = backoff_delay(attempt)
+        self.block(resource, delay)
+        return delay
+
+
+def backoff_delay(attempt, base=BACKOFF_BASE, cap=BACKOFF_CAP):
+    """Backoff exponencial com "full jitter": uniforme em [0, min(cap, base * 2^(n-1))]."""
+    return random.uniform(0, min(cap, base * 2 ** (attempt - 1)))
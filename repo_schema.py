@@ -0,0 +1,94 @@
+"""
+repo_schema.py
+
+Esquema da lista de repositórios (lab02_repos.csv / .parquet / .feather).
+
+Os nós GraphQL são achatados em colunas tipadas (primary_language,
+releases_count, default_branch, ...) antes de salvar, e load_repos lê o
+arquivo de volta com dtypes explícitos, sem avaliar linha a linha. Arquivos
+antigos, com dicts serializados ("{'totalCount': 9}"), são convertidos com
+expressões regulares vetorizadas.
+"""
+
+import pandas as pd
+
+from tabular_io import format_from_path, read_table
+
+REPO_SCHEMA = {
+    "nameWithOwner": "string",
+    "url": "string",
+    "createdAt": "datetime64[ns, UTC]",
+    "updatedAt": "datetime64[ns, UTC]",
+    "stargazerCount": "Int64",
+    "primary_language": "string",
+    "releases_count": "Int64",
+    "disk_usage_kb": "Int64",
+    "default_branch": "string",
+    "head_oid": "string",
+    "collected_at": "datetime64[ns, UTC]",
+}
+DATE_COLUMNS = [c for c, t in REPO_SCHEMA.items() if t.startswith("datetime")]
+CSV_DTYPES = {c: t for c, t in REPO_SCHEMA.items() if c not in DATE_COLUMNS}
+REQUIRED_COLUMNS = ["nameWithOwner", "createdAt", "stargazerCount"]
+
+
+def flatten_repo(node, collected_at=None):
+    """Converte um nó `... on Repository` do GraphQL num registro plano.
+
+    `collected_at` é o instante da coleta (o mesmo para toda a busca), usado
+    como referência das idades.
+    """
+    branch_ref = node.get("defaultBranchRef") or {}
+    return {
+        "nameWithOwner": node.get("nameWithOwner"),
+        "url": node.get("url"),
+        "createdAt": node.get("createdAt"),
+        "updatedAt": node.get("updatedAt"),
+        "stargazerCount": node.get("stargazerCount"),
+        "primary_language": (node.get("primaryLanguage") or {}).get("name"),
+        "releases_count": (node.get("releases") or {}).get("totalCount"),
+        "disk_usage_kb": node.get("diskUsage"),
+        "default_branch": branch_ref.get("name"),
+        "head_oid": (branch_ref.get("target") or {}).get("oid"),
+        "collected_at": collected_at,
+    }
+
+
+def repos_to_frame(repos):
+    """DataFrame tipado a partir de registros planos."""
+    df = pd.DataFrame(repos, columns=list(REPO_SCHEMA))
+    return apply_schema(df)
+
+
+def apply_schema(df):
+    for col in DATE_COLUMNS:
+        if col in df.columns:
+            df[col] = pd.to_datetime(df[col], utc=True, format="ISO8601").astype(REPO_SCHEMA[col])
+    return df.astype({c: t for c, t in CSV_DTYPES.items() if c in df.columns})
+
+
+def _upgrade_legacy(df):
+    # formato antigo: primaryLanguage/releases como repr de dict Python
+    if "primary_language" not in df.columns and "primaryLanguage" in df.columns:
+        df["primary_language"] = df["primaryLanguage"].astype("string").str.extract(r"'name':\s*'([^']*)'", expand=False)
+        df = df.drop(columns=["primaryLanguage"])
+    if "releases_count" not in df.columns and "releases" in df.columns:
+        df["releases_count"] = pd.to_numeric(
+            df["releases"].astype("string").str.extract(r"'totalCount':\s*(\d+)", expand=False)
+        )
+        df = df.drop(columns=["releases"])
+    return df
+
+
+def load_repos(path):
+    """Lê a lista de repositórios validando colunas e aplicando os dtypes do esquema."""
+    fmt = format_from_path(path)
+    if fmt == "csv":
+        df = read_table(path, dtype=CSV_DTYPES)
+    else:
+        df = read_table(path)
+    df = _upgrade_legacy(df)
+    missing = [c for c in REQUIRED_COLUMNS if c not in df.columns]
+    if missing:
+        raise ValueError(f"{path}: colunas obrigatórias ausentes: {', '.join(missing)}")
+    return apply_schema(df)
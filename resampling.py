@@ -0,0 +1,127 @@
+"""
+resampling.py
+
+Intervalos de confiança por bootstrap e p-valores por permutação para
+correlações de Pearson/Spearman, vetorizados em NumPy.
+
+Todas as reamostragens de um lote são geradas como um array 2-D de índices
+(reamostras × n); cada linha é ranqueada e correlacionada de uma vez, sem
+laço Python por reamostra. Lotes limitados (RESAMPLE_BATCH) mantêm a memória
+sob controle. Cada lote tem a sua semente (SeedSequence.spawn, uma por lote
+de tamanho fixo), e com workers > 1 os lotes são divididos entre processos;
+como as sementes não dependem do número de workers, o resultado é o mesmo
+para uma mesma semente em qualquer máquina.
+"""
+
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from scipy.stats import rankdata
+
+RESAMPLES = 2000
+CONFIDENCE = 0.95
+RESAMPLE_BATCH = 500
+SEED = 20250921
+METHODS = ("pearson", "spearman")
+
+
+def rowwise_corr(A, B):
+    """Correlação de Pearson entre as linhas correspondentes de A e B (k × n)."""
+    Ac = A - A.mean(axis=1, keepdims=True)
+    Bc = B - B.mean(axis=1, keepdims=True)
+    den = np.sqrt((Ac ** 2).sum(axis=1) * (Bc ** 2).sum(axis=1))
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.clip((Ac * Bc).sum(axis=1) / den, -1.0, 1.0)
+
+
+def _paired(x, y):
+    x = np.asarray(x, dtype="float64")
+    y = np.asarray(y, dtype="float64")
+    mask = ~(np.isnan(x) | np.isnan(y))
+    return x[mask], y[mask]
+
+
+def _batches(total, size=RESAMPLE_BATCH):
+    while total > 0:
+        step = min(size, total)
+        yield step
+        total -= step
+
+
+def _bootstrap_shard(args):
+    x, y, method, batches = args
+    n = len(x)
+    out = []
+    for size, seed in batches:
+        idx = np.random.default_rng(seed).integers(0, n, size=(size, n))
+        xs, ys = x[idx], y[idx]
+        if method == "spearman":
+            # reamostras repetem observações: ranquear de novo, linha a linha
+            xs, ys = rankdata(xs, axis=1), rankdata(ys, axis=1)
+        out.append(rowwise_corr(xs, ys))
+    return np.concatenate(out) if out else np.empty(0)
+
+
+def _permutation_shard(args):
+    x, y, method, batches = args
+    if method == "spearman":
+        # permutar não cria empates novos: os ranks são calculados uma vez só
+        x, y = rankdata(x), rankdata(y)
+    out = []
+    for size, seed in batches:
+        idx = np.random.default_rng(seed).permuted(np.tile(np.arange(len(y)), (size, 1)), axis=1)
+        out.append(rowwise_corr(np.broadcast_to(x, idx.shape), y[idx]))
+    return np.concatenate(out) if out else np.empty(0)
+
+
+def _run_sharded(func, x, y, method, resamples, seed, workers):
+    if method not in METHODS:
+        raise ValueError(f"Método desconhecido: {method} (use {', '.join(METHODS)})")
+    # uma semente por lote fixo: o número de workers só muda quem calcula cada lote
+    sizes = list(_batches(resamples))
+    batches = list(zip(sizes, np.random.SeedSequence(seed).spawn(len(sizes))))
+    workers = max(1, min(workers or 1, len(batches)))
+    step = max(1, -(-len(batches) // workers))
+    jobs = [(x, y, method, batches[k:k + step]) for k in range(0, max(len(batches), 1), step)]
+    if len(jobs) == 1:
+        return func(jobs[0])
+    with ProcessPoolExecutor(max_workers=len(jobs)) as executor:
+        return np.concatenate(list(executor.map(func, jobs)))
+
+
+def bootstrap_ci(x, y, method="spearman", resamples=RESAMPLES, confidence=CONFIDENCE,
+                 seed=SEED, workers=1):
+    """Intervalo percentil [lo, hi] da correlação por bootstrap dos pares (x, y)."""
+    x, y = _paired(x, y)
+    if len(x) < 3:
+        return [float("nan"), float("nan")]
+    stats = _run_sharded(_bootstrap_shard, x, y, method, resamples, seed, workers)
+    alpha = (1 - confidence) / 2
+    lo, hi = np.nanquantile(stats, [alpha, 1 - alpha])
+    return [float(lo), float(hi)]
+
+
+def permutation_pvalue(x, y, method="spearman", resamples=RESAMPLES, seed=SEED, workers=1):
+    """P-valor bicaudal por permutação: (#{|r*| >= |r|} + 1) / (reamostras + 1)."""
+    x, y = _paired(x, y)
+    if len(x) < 3:
+        return float("nan")
+    if method == "spearman":
+        observed = rowwise_corr(rankdata(x)[None, :], rankdata(y)[None, :])[0]
+    else:
+        observed = rowwise_corr(x[None, :], y[None, :])[0]
+    stats = _run_sharded(_permutation_shard, x, y, method, resamples, seed, workers)
+    extreme = np.count_nonzero(np.abs(stats) >= abs(observed) - 1e-12)
+    return float((extreme + 1) / (len(stats) + 1))
+
+
+def resample_summary(x, y, resamples=RESAMPLES, confidence=CONFIDENCE, seed=SEED, workers=None):
+    """IC bootstrap de Pearson e Spearman e p-valor de permutação (Spearman) de um par."""
+    workers = workers if workers is not None else os.cpu_count() or 1
+    return {
+        "pearson_ci": bootstrap_ci(x, y, "pearson", resamples, confidence, seed, workers),
+        "spearman_ci": bootstrap_ci(x, y, "spearman", resamples, confidence, seed, workers),
+        "permutation_p": permutation_pvalue(x, y, "spearman", resamples, seed, workers),
+        "resamples": int(resamples),
+    }
@@ -0,0 +1,78 @@
+"""
+run_journal.py
+
+Diário de execução append-only (JSONL) para retomar coletas interrompidas.
+
+Cada linha registra a conclusão de uma etapa de um repositório:
+    {"repo": "owner/name", "stage": "ck", "ts": "...", "head_oid": "...", ...}
+
+Etapas usadas por atividade2.process_all_repos_parallel:
+ - "download": fontes extraídos por completo
+ - "ck": CSVs do CK gravados (campo "ck_result_dir")
+ - "summary": linha consolidada pronta (campo "summary"; null = repo pulado)
+
+As etapas guardam o commit analisado (head_oid): ao retomar, entradas de
+outro commit são descartadas e o repositório é processado de novo. Campos do
+repositório que mudam sem mudar o código (estrelas, idade, releases) são
+recalculados a partir da coleta atual, e só as métricas do CK são reaproveitadas.
+"""
+
+import json
+import os
+import threading
+from datetime import datetime, timezone
+from pathlib import Path
+
+
+def _to_json(value):
+    # escalares numpy (np.int64, np.float32...) viram tipos nativos
+    if hasattr(value, "item"):
+        return value.item()
+    return str(value)
+
+
+class RunJournal:
+    def __init__(self, path):
+        self.path = Path(path)
+        self.lock = threading.Lock()
+        self.state = {}
+        self._load()
+        self.fh = open(self.path, "a", encoding="utf-8")
+
+    def _load(self):
+        if not self.path.exists():
+            return
+        with open(self.path, encoding="utf-8") as fh:
+            for line in fh:
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    # última linha truncada por uma queda no meio da escrita
+                    continue
+                self.state.setdefault(entry["repo"], {})[entry["stage"]] = entry
+
+    def record(self, repo, stage, **data):
+        entry = {"repo": repo, "stage": stage, "ts": datetime.now(timezone.utc).isoformat(), **data}
+        line = json.dumps(entry, ensure_ascii=False, default=_to_json)
+        with self.lock:
+            self.fh.write(line + "\n")
+            self.fh.flush()
+            os.fsync(self.fh.fileno())
+            self.state.setdefault(repo, {})[stage] = entry
+
+    def is_done(self, repo, stage):
+        return stage in self.state.get(repo, {})
+
+    def get(self, repo, stage):
+        return self.state.get(repo, {}).get(stage)
+
+    def close(self):
+        with self.lock:
+            self.fh.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
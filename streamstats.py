@@ -0,0 +1,233 @@
+"""
+streamstats.py
+
+Estatísticas de uma só passada, em memória constante, sobre CSVs do CK.
+
+ - RunningStats: contagem, soma, média e variância (Welford), mínimo e máximo;
+   add_array acumula blocos NumPy inteiros (leitura em chunks)
+ - P2Quantile: quantil aproximado (algoritmo P² de Jain & Chlamtac)
+ - summarize_csv: lê o CSV em chunks com pandas (só as colunas pedidas, dtypes
+   do CK) e alimenta um acumulador por coluna com add_array
+
+Valores vazios ou não numéricos são ignorados (como NaN no pandas); "true" e
+"false" contam como 1 e 0. A variância usa ddof=1, igual ao Series.std().
+Quantis (P²) são opcionais: exigem uma atualização por valor, então só são
+calculados quando pedidos.
+"""
+
+import math
+
+import numpy as np
+import pandas as pd
+
+from ck_io import CK_DTYPES, read_header
+
+SUMMARY_CHUNKSIZE = 100_000
+
+
+class RunningStats:
+    def __init__(self):
+        self.count = 0
+        self.sum = 0.0
+        self._mean = 0.0
+        self._m2 = 0.0
+        self.min = math.nan
+        self.max = math.nan
+
+    def add(self, x):
+        self.count += 1
+        self.sum += x
+        if self.count == 1:
+            self._mean = x
+            self.min = x
+            self.max = x
+            return
+        delta = x - self._mean
+        self._mean += delta / self.count
+        self._m2 += delta * (x - self._mean)
+        if x < self.min:
+            self.min = x
+        elif x > self.max:
+            self.max = x
+
+    def merge(self, other):
+        """Combina dois acumuladores (fórmula paralela de Chan et al.)."""
+        if other.count == 0:
+            return self
+        if self.count == 0:
+            self.__dict__.update(other.__dict__)
+            return self
+        n = self.count + other.count
+        delta = other._mean - self._mean
+        self._m2 += other._m2 + delta * delta * self.count * other.count / n
+        self._mean += delta * other.count / n
+        self.count = n
+        self.sum += other.sum
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        return self
+
+    def add_array(self, values):
+        """Acumula um bloco inteiro (NumPy) de uma vez; NaN é ignorado."""
+        values = np.asarray(values, dtype="float64")
+        values = values[~np.isnan(values)]
+        if values.size == 0:
+            return self
+        chunk = RunningStats()
+        chunk.count = int(values.size)
+        chunk.sum = float(values.sum())
+        chunk._mean = chunk.sum / chunk.count
+        chunk._m2 = float(((values - chunk._mean) ** 2).sum())
+        chunk.min = float(values.min())
+        chunk.max = float(values.max())
+        return self.merge(chunk)
+
+    @property
+    def mean(self):
+        # soma/contagem (como o pandas); a média de Welford só alimenta a variância
+        return self.sum / self.count if self.count else math.nan
+
+    def variance(self, ddof=1):
+        if self.count - ddof <= 0:
+            return math.nan
+        return self._m2 / (self.count - ddof)
+
+    def std(self, ddof=1):
+        return math.sqrt(self.variance(ddof))
+
+
+class P2Quantile:
+    """Estimador P²: 5 marcadores, sem guardar as observações."""
+
+    def __init__(self, p):
+        self.p = p
+        self.n = 0
+        self.heights = []
+        self.pos = [1, 2, 3, 4, 5]
+        self.desired = [1, 1 + 2 * p, 1 + 4 * p, 3 + 2 * p, 5]
+        self.incr = [0, p / 2, p, (1 + p) / 2, 1]
+
+    def add(self, x):
+        q = self.heights
+        self.n += 1
+        if self.n <= 5:
+            q.append(x)
+            if self.n == 5:
+                q.sort()
+            return
+
+        if x < q[0]:
+            q[0] = x
+            k = 0
+        elif x >= q[4]:
+            q[4] = x
+            k = 3
+        else:
+            k = 0
+            while x >= q[k + 1]:
+                k += 1
+        for i in range(k + 1, 5):
+            self.pos[i] += 1
+        for i in range(5):
+            self.desired[i] += self.incr[i]
+
+        pos = self.pos
+        for i in (1, 2, 3):
+            d = self.desired[i] - pos[i]
+            if (d >= 1 and pos[i + 1] - pos[i] > 1) or (d <= -1 and pos[i - 1] - pos[i] < -1):
+                d = 1 if d > 0 else -1
+                qp = q[i] + d / (pos[i + 1] - pos[i - 1]) * (
+                    (pos[i] - pos[i - 1] + d) * (q[i + 1] - q[i]) / (pos[i + 1] - pos[i])
+                    + (pos[i + 1] - pos[i] - d) * (q[i] - q[i - 1]) / (pos[i] - pos[i - 1])
+                )
+                if not q[i - 1] < qp < q[i + 1]:
+                    # ajuste parabólico saiu do intervalo: usa o linear
+                    qp = q[i] + d * (q[i + d] - q[i]) / (pos[i + d] - pos[i])
+                q[i] = qp
+                pos[i] += d
+
+    def value(self):
+        if self.n == 0:
+            return math.nan
+        if self.n < 5:
+            # poucas observações: quantil exato com interpolação linear
+            data = sorted(self.heights)
+            h = self.p * (len(data) - 1)
+            lo = math.floor(h)
+            hi = min(lo + 1, len(data) - 1)
+            return data[lo] + (h - lo) * (data[hi] - data[lo])
+        return self.heights[2]
+
+
+class ColumnStats(RunningStats):
+    def __init__(self, quantiles=()):
+        super().__init__()
+        self.quantiles = {q: P2Quantile(q) for q in quantiles}
+
+    def add(self, x):
+        super().add(x)
+        for est in self.quantiles.values():
+            est.add(x)
+
+    def add_array(self, values):
+        values = np.asarray(values, dtype="float64")
+        values = values[~np.isnan(values)]
+        RunningStats.add_array(self, values)
+        for est in self.quantiles.values():
+            for x in values.tolist():
+                est.add(x)
+        return self
+
+    def quantile(self, q):
+        return self.quantiles[q].value()
+
+    @property
+    def median(self):
+        return self.quantile(0.5)
+
+
+def column_values(series):
+    """Coluna de um chunk como float64 (true/false -> 1/0, inválidos -> NaN)."""
+    if series.dtype == object:
+        low = series.str.lower()
+        series = series.mask(low == "true", 1.0).mask(low == "false", 0.0)
+    return pd.to_numeric(series, errors="coerce").to_numpy(dtype="float64", na_value=np.nan)
+
+
+def _read_chunks(path, cols, dtype, chunksize):
+    return pd.read_csv(path, usecols=cols, dtype=dtype, chunksize=chunksize,
+                       true_values=["true"], false_values=["false"], skip_blank_lines=True)
+
+
+def summarize_csv(path, columns, quantiles=(), chunksize=SUMMARY_CHUNKSIZE):
+    """Uma passada sobre `path`; retorna (nº de linhas, {coluna: ColumnStats}).
+
+    Lê só as colunas pedidas, em chunks de `chunksize` linhas (memória
+    limitada ao chunk). Colunas pedidas que não existem no arquivo ficam
+    fora do dicionário.
+    """
+    header = read_header(path)
+    if header == [""]:
+        return 0, {}
+    cols = [c for c in columns if c in header]
+    if not cols:
+        # nenhuma coluna pedida: lê só a primeira, para contar as linhas
+        rows = sum(len(chunk) for chunk in _read_chunks(path, header[:1], {}, chunksize))
+        return rows, {}
+    dtype = {c: CK_DTYPES[c] for c in cols if c in CK_DTYPES}
+    try:
+        return _summarize_chunks(_read_chunks(path, cols, dtype, chunksize), cols, quantiles)
+    except (ValueError, TypeError, OverflowError):
+        # valores vazios/inválidos não cabem em int: relê com float64
+        dtype = {c: "float64" for c in dtype}
+        return _summarize_chunks(_read_chunks(path, cols, dtype, chunksize), cols, quantiles)
+
+
+def _summarize_chunks(chunks, cols, quantiles):
+    stats = {c: ColumnStats(quantiles) for c in cols}
+    rows = 0
+    for chunk in chunks:
+        rows += len(chunk)
+        for c in cols:
+            stats[c].add_array(column_values(chunk[c]))
+    return rows, stats
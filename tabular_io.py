@@ -0,0 +1,110 @@
+"""
+tabular_io.py
+
+Leitura/escrita das tabelas do pipeline em CSV, Parquet ou Feather.
+
+O formato vem do parâmetro `fmt` ou da extensão do arquivo. Parquet e Feather
+guardam os dtypes das colunas (sem reinferência a cada leitura) e usam
+compressão zstd; ambos exigem o pacote pyarrow. CSV continua disponível
+como formato de exportação. iter_table lê qualquer um dos três em blocos,
+para análises que não cabem na memória.
+"""
+
+from pathlib import Path
+
+import pandas as pd
+
+FORMATS = {".csv": "csv", ".parquet": "parquet", ".feather": "feather"}
+DEFAULT_COMPRESSION = "zstd"
+
+
+def format_from_path(path):
+    fmt = FORMATS.get(Path(path).suffix.lower())
+    if fmt is None:
+        raise ValueError(f"Formato não reconhecido para {path} (use .csv, .parquet ou .feather)")
+    return fmt
+
+
+def with_format(path, fmt):
+    """Troca a extensão de `path` pela do formato `fmt` (ex.: lab02_repos.parquet)."""
+    if fmt not in FORMATS.values():
+        raise ValueError(f"Formato desconhecido: {fmt}")
+    return str(Path(path).with_suffix("." + fmt))
+
+
+def _require_pyarrow(fmt):
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        raise RuntimeError(f"O formato {fmt} requer o pacote pyarrow (pip install pyarrow).")
+
+
+def write_table(df, path, fmt=None, compression=DEFAULT_COMPRESSION):
+    fmt = fmt or format_from_path(path)
+    if fmt == "csv":
+        df.to_csv(path, index=False, encoding="utf-8")
+    elif fmt == "parquet":
+        _require_pyarrow(fmt)
+        df.to_parquet(path, index=False, compression=compression)
+    elif fmt == "feather":
+        _require_pyarrow(fmt)
+        df.reset_index(drop=True).to_feather(path, compression=compression)
+    else:
+        raise ValueError(f"Formato desconhecido: {fmt}")
+    return path
+
+
+def read_table(path, columns=None, fmt=None, **csv_kwargs):
+    fmt = fmt or format_from_path(path)
+    if fmt == "csv":
+        return pd.read_csv(path, usecols=columns, **csv_kwargs)
+    _require_pyarrow(fmt)
+    if fmt == "parquet":
+        return pd.read_parquet(path, columns=columns)
+    if fmt == "feather":
+        return pd.read_feather(path, columns=columns)
+    raise ValueError(f"Formato desconhecido: {fmt}")
+
+
+def table_columns(path, fmt=None):
+    """Nomes das colunas, lidos só do cabeçalho/esquema do arquivo."""
+    fmt = fmt or format_from_path(path)
+    if fmt == "csv":
+        return list(pd.read_csv(path, nrows=0).columns)
+    _require_pyarrow(fmt)
+    if fmt == "parquet":
+        import pyarrow.parquet as pq
+
+        return pq.read_schema(path).names
+    if fmt == "feather":
+        import pyarrow.ipc as ipc
+
+        with ipc.open_file(path) as reader:
+            return reader.schema.names
+    raise ValueError(f"Formato desconhecido: {fmt}")
+
+
+def iter_table(path, columns=None, chunksize=100_000, fmt=None, **csv_kwargs):
+    """Lê a tabela em DataFrames de até `chunksize` linhas, sem carregá-la inteira."""
+    fmt = fmt or format_from_path(path)
+    if fmt == "csv":
+        yield from pd.read_csv(path, usecols=columns, chunksize=chunksize, **csv_kwargs)
+        return
+    _require_pyarrow(fmt)
+    if fmt == "parquet":
+        import pyarrow.parquet as pq
+
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=chunksize, columns=columns):
+            yield batch.to_pandas()
+    elif fmt == "feather":
+        import pyarrow.ipc as ipc
+
+        with ipc.open_file(path) as reader:
+            for i in range(reader.num_record_batches):
+                batch = reader.get_batch(i)
+                if columns is not None:
+                    batch = batch.select(columns)
+                for start in range(0, batch.num_rows, chunksize):
+                    yield batch.slice(start, chunksize).to_pandas()
+    else:
+        raise ValueError(f"Formato desconhecido: {fmt}")